@@ -0,0 +1,81 @@
+import argparse
+import logging
+
+from clickhouse_driver import Client
+
+from init_db import CH_HOST_ADMIN, CH_PORT_ADMIN, CH_USER_BOT, CH_PASSWORD_BOT, CH_DB_NAME, NEWS_TEXT_TTL_DAYS
+
+
+# Должно совпадать с bot.clickhouse_utils.news_text_hash
+TEXT_HASH_EXPRESSION = "reinterpretAsUInt64(substring(SHA256(news_text), 1, 8))"
+
+def requests_log_partitions(client: Client) -> list[str]:
+    rows = client.execute(
+        "SELECT DISTINCT partition_id FROM system.parts "
+        "WHERE database = %(database)s AND table = 'requests_log' AND active ORDER BY partition_id",
+        {"database": CH_DB_NAME},
+    )
+    return [partition_id for (partition_id,) in rows]
+
+def has_news_text_column(client: Client) -> bool:
+    return client.execute(
+        "SELECT count() FROM system.columns WHERE database = %(database)s AND table = 'requests_log' AND name = 'news_text'",
+        {"database": CH_DB_NAME},
+    )[0][0] > 0
+
+def backfill_partition(client: Client, partition_id: str):
+    """
+    Copies texts of one requests_log partition into news_texts and fills text_hash of its rows.
+    """
+    # Тексты старше TTL в news_texts все равно удалились бы при слиянии
+    client.execute(f"""
+    INSERT INTO {CH_DB_NAME}.news_texts (text_hash, news_text, last_seen)
+    SELECT {TEXT_HASH_EXPRESSION} AS text_hash, any(news_text), max(request_timestamp)
+    FROM {CH_DB_NAME}.requests_log
+    WHERE _partition_id = %(partition_id)s
+      AND news_text != ''
+      AND request_timestamp >= now() - INTERVAL {NEWS_TEXT_TTL_DAYS} DAY
+    GROUP BY text_hash
+    """, {"partition_id": partition_id})
+    client.execute(f"""
+    ALTER TABLE {CH_DB_NAME}.requests_log UPDATE text_hash = {TEXT_HASH_EXPRESSION}
+    IN PARTITION ID %(partition_id)s
+    WHERE text_hash = 0 AND news_text != ''
+    """, {"partition_id": partition_id}, settings={"mutations_sync": 2})
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос текстов новостей из requests_log.news_text в news_texts "
+                                                 "и заполнение text_hash (после миграции init_db.py).")
+    parser.add_argument("--partition", action="append", default=None,
+                        help="ID партиций requests_log (YYYYMM), по умолчанию все")
+    parser.add_argument("--drop-news-text", action="store_true",
+                        help="После переноса удалить колонку news_text из requests_log")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Переписать партиции (OPTIMIZE FINAL), чтобы новые кодеки применились к старым данным")
+    args = parser.parse_args()
+
+    client = Client(host=CH_HOST_ADMIN, port=CH_PORT_ADMIN, user=CH_USER_BOT, password=CH_PASSWORD_BOT,
+                    database=CH_DB_NAME, send_receive_timeout=3600)
+    partitions = args.partition or requests_log_partitions(client)
+
+    if has_news_text_column(client):
+        for partition_id in partitions:
+            logging.info(f"Перенос текстов партиции {partition_id}...")
+            backfill_partition(client, partition_id)
+        if args.drop_news_text:
+            client.execute(f"ALTER TABLE {CH_DB_NAME}.requests_log DROP COLUMN news_text", settings={"mutations_sync": 2})
+            logging.info("Колонка news_text удалена из requests_log.")
+    else:
+        logging.info("В requests_log нет колонки news_text, переносить нечего.")
+
+    if args.optimize:
+        for partition_id in partitions:
+            logging.info(f"Перезапись партиции {partition_id} с новыми кодеками...")
+            client.execute(f"OPTIMIZE TABLE {CH_DB_NAME}.requests_log PARTITION ID %(partition_id)s FINAL",
+                           {"partition_id": partition_id})
+
+    client.disconnect()
+    logging.info("Перенос текстов завершен.")
+
+if __name__ == "__main__":
+    main()
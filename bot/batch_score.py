@@ -0,0 +1,223 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from .clickhouse_utils import (execute_query, news_text_hash, news_text_rows, REQUESTS_LOG_COLUMNS,
+                               STAGE_TIMING_COLUMNS, NEWS_TEXTS_COLUMNS)
+from .config import CH_DB, MODELS_CONFIG, setup_logging
+from .model_registry import model_registry
+from . import ml_utils
+
+
+def iter_records(path: str, input_format: str):
+    if input_format == "csv":
+        csv.field_size_limit(sys.maxsize)
+        with open(path, newline="", encoding="utf-8") as input_file:
+            yield from csv.DictReader(input_file)
+    else:
+        with open(path, encoding="utf-8") as input_file:
+            for line in input_file:
+                if line.strip():
+                    yield json.loads(line)
+
+def record_text(record: dict, text_columns: list[str]) -> str:
+    return " ".join(str(record.get(column) or "") for column in text_columns)
+
+def iter_chunks(iterable, chunk_size: int):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+class CsvResultWriter:
+    def __init__(self, path: str, fieldnames: list[str]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        self._writer.writeheader()
+
+    def write(self, rows: list[dict]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    def __init__(self, path: str, fieldnames: list[str]):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Для записи в Parquet установите pyarrow") from e
+        self._pyarrow = pyarrow
+        self._path = path
+        self._fieldnames = fieldnames
+        self._writer = None
+
+    def write(self, rows: list[dict]):
+        table = self._pyarrow.Table.from_pylist(rows).select(self._fieldnames)
+        if self._writer is None:
+            self._writer = self._pyarrow.parquet.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ClickHouseResultWriter:
+    def __init__(self, model_ids: list[str]):
+        self._model_ids = model_ids
+
+    def write(self, rows: list[dict]):
+        log_rows = []
+        for row in rows:
+            # Оценки одного текста разными моделями образуют группу
+            request_group_id = uuid.uuid4()
+            text_hash = news_text_hash(row["news_text"])
+            for model_id in self._model_ids:
+                probability = row[f"{model_id}_probability"]
+                log_rows.append({
+                    "request_id": uuid.uuid4(),
+                    "user_id": 0,
+                    "chat_id": 0,
+                    "message_id": row["row_number"],
+                    "text_hash": text_hash,
+                    "predicted_label": row[f"{model_id}_label"],
+                    "prediction_probability": probability if probability is not None else 0.0,
+                    "model_version": ml_utils.get_model_version(model_id),
+                    "processing_time_ms": row["processing_time_ms"],
+                    "is_cached": 0,
+                    **{column: 0.0 for column in STAGE_TIMING_COLUMNS},
+                    "request_group_id": request_group_id,
+                })
+        text_rows = news_text_rows([row["news_text"] for row in rows])
+        if text_rows:
+            execute_query(f"INSERT INTO {CH_DB}.news_texts ({', '.join(NEWS_TEXTS_COLUMNS)}) VALUES", text_rows)
+        execute_query(f"INSERT INTO {CH_DB}.requests_log ({', '.join(REQUESTS_LOG_COLUMNS)}) VALUES", log_rows)
+
+    def close(self):
+        pass
+
+
+def score_chunk(texts: list[str], model_ids: list[str], preprocess_pool: ProcessPoolExecutor | None,
+                workers: int) -> dict[str, list[tuple[str, float | None]]]:
+    # Длинные документы оцениваются по окнам, как в боте, остальные - общим батчем
+    long_positions = [i for i, text in enumerate(texts) if ml_utils.is_long_text(text)]
+    batch_texts = [text if not ml_utils.is_long_text(text) else "" for text in texts]
+    if preprocess_pool is not None:
+        chunksize = max(1, len(texts) // (workers * 4))
+        preprocessed_texts = list(preprocess_pool.map(ml_utils.preprocess_text, batch_texts, chunksize=chunksize))
+    else:
+        preprocessed_texts = [ml_utils.preprocess_text(text) for text in batch_texts]
+
+    scored_positions = [i for i, text in enumerate(preprocessed_texts) if text.strip()]
+    results = {model_id: [(ml_utils.UNPROCESSABLE_LABEL, None)] * len(texts) for model_id in model_ids}
+    if long_positions:
+        model_specs = [model_registry.get_spec(model_id) for model_id in model_ids]
+        components = [ml_utils.get_model_components(model_spec) for model_spec in model_specs]
+        for position in long_positions:
+            chunk_results, _ = ml_utils.score_chunked_text(texts[position], model_specs, components)
+            for model_id, result in zip(model_ids, chunk_results):
+                results[model_id][position] = result
+    if not scored_positions:
+        return results
+
+    # Векторизация один раз на чанк для каждого векторизатора, общая для моделей с ним
+    scored_texts = [preprocessed_texts[i] for i in scored_positions]
+    vectors_by_path = {}
+    for model_id in model_ids:
+        model_spec = model_registry.get_spec(model_id)
+        vectorizer, model = ml_utils.get_model_components(model_spec)
+        text_vectors = vectors_by_path.get(model_spec["vectorizer_path"])
+        if text_vectors is None:
+            text_vectors = vectors_by_path[model_spec["vectorizer_path"]] = vectorizer.transform(scored_texts)
+        predictions, probabilities = ml_utils.score_text_vectors(model, model_spec, text_vectors)
+        for position, prediction, probability in zip(scored_positions, predictions, probabilities):
+            results[model_id][position] = (ml_utils.prediction_to_label(prediction), float(probability))
+    return results
+
+def create_writer(args, fieldnames: list[str]):
+    if args.clickhouse:
+        return ClickHouseResultWriter(args.model)
+    if args.output.endswith(".parquet"):
+        return ParquetResultWriter(args.output, fieldnames)
+    return CsvResultWriter(args.output, fieldnames)
+
+def run_batch_scoring(args):
+    input_format = args.format or ("jsonl" if args.input.endswith((".jsonl", ".json")) else "csv")
+    fieldnames = ["row_number"] + ([args.id_column] if args.id_column else [])
+    for model_id in args.model:
+        fieldnames += [f"{model_id}_label", f"{model_id}_probability"]
+
+    ml_utils.load_ml_components()
+    writer = create_writer(args, fieldnames)
+    preprocess_pool = None
+    if args.workers > 1:
+        preprocess_pool = ProcessPoolExecutor(max_workers=args.workers, initializer=ml_utils.load_nltk_components)
+
+    started_at = time.perf_counter()
+    total_rows = 0
+    try:
+        records = iter_records(args.input, input_format)
+        if args.limit is not None:
+            records = itertools.islice(records, args.limit)
+        for chunk in iter_chunks(records, args.chunk_size):
+            chunk_started_at = time.perf_counter()
+            texts = [record_text(record, args.text_column) for record in chunk]
+            results = score_chunk(texts, args.model, preprocess_pool, args.workers)
+            processing_time_ms = int((time.perf_counter() - chunk_started_at) * 1000 / len(chunk))
+
+            rows = []
+            for i, (record, text) in enumerate(zip(chunk, texts)):
+                row = {"row_number": total_rows + i, "news_text": text, "processing_time_ms": processing_time_ms}
+                if args.id_column:
+                    row[args.id_column] = record.get(args.id_column)
+                for model_id in args.model:
+                    row[f"{model_id}_label"], row[f"{model_id}_probability"] = results[model_id][i]
+                rows.append(row)
+            writer.write(rows if args.clickhouse else [{key: row[key] for key in fieldnames} for row in rows])
+
+            total_rows += len(chunk)
+            elapsed_seconds = time.perf_counter() - started_at
+            logging.info(f"Обработано строк: {total_rows}, скорость: {total_rows / elapsed_seconds:.1f} строк/с")
+    finally:
+        writer.close()
+        if preprocess_pool is not None:
+            preprocess_pool.shutdown()
+
+    elapsed_seconds = time.perf_counter() - started_at
+    logging.info(f"Готово: {total_rows} строк за {elapsed_seconds:.1f} с "
+                 f"({total_rows / elapsed_seconds if elapsed_seconds else 0.0:.1f} строк/с).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная оценка корпусов CSV/JSONL моделями бота.")
+    parser.add_argument("input", help="Входной файл CSV или JSONL")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None, help="Формат входа (по умолчанию по расширению)")
+    parser.add_argument("--text-column", action="append", default=None,
+                        help="Колонки с текстом, объединяются через пробел (по умолчанию title и text)")
+    parser.add_argument("--id-column", default=None, help="Колонка-идентификатор, переносится в результат")
+    parser.add_argument("--model", action="append", choices=list(MODELS_CONFIG), default=None,
+                        help="Модели для оценки (по умолчанию все)")
+    output_group = parser.add_mutually_exclusive_group(required=True)
+    output_group.add_argument("--output", help="Файл результатов: .csv или .parquet")
+    output_group.add_argument("--clickhouse", action="store_true", help="Записать результаты в requests_log")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессы для предобработки текста")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    args.text_column = args.text_column or ["title", "text"]
+    args.model = args.model or list(MODELS_CONFIG)
+
+    setup_logging()
+    run_batch_scoring(args)
+
+if __name__ == "__main__":
+    main()
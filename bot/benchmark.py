@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+from . import ml_utils
+from .check_preprocessing import DEFAULT_CORPUS_FILES, iter_corpus_texts
+from .holdout import notebook_test_split
+from .model_registry import model_registry
+from .config import (MODELS_CONFIG, INFERENCE_WORKERS, INFERENCE_BATCH_MAX_SIZE, INFERENCE_BATCH_WINDOW_MS,
+                     CHUNKED_INFERENCE_MIN_CHARS, CHUNK_WINDOW_WORDS, CHUNK_MAX_WINDOWS, CHUNK_GROUP_SIZE,
+                     CHUNK_AGGREGATION, CHUNK_EARLY_EXIT_CONFIDENCE, setup_logging)
+
+
+DEFAULT_LENGTH_BUCKETS = [1000, 5000]
+DEFAULT_CONCURRENCY_LEVELS = [1, 8, 32]
+DEFAULT_LONG_DOCUMENT_LENGTHS = [10000, 50000, 200000]
+BENCHMARK_DIR = "benchmarks"
+
+def stage_rss_mb(rss_before_mb: float) -> dict:
+    # Текущий RSS основного процесса до и после этапа: ru_maxrss не сбрасывается,
+    # и все этапы после самого тяжелого показывали бы один и тот же пик
+    rss_after_mb = ml_utils.current_rss_mb()
+    return {"before": rss_before_mb, "after": rss_after_mb, "delta": rss_after_mb - rss_before_mb}
+
+def latency_summary(latencies_ms: list[float], elapsed_seconds: float | None = None) -> dict:
+    if not latencies_ms:
+        return {"count": 0}
+    values = np.asarray(latencies_ms)
+    elapsed_seconds = elapsed_seconds if elapsed_seconds is not None else values.sum() / 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "throughput_per_s": len(values) / elapsed_seconds if elapsed_seconds else 0.0,
+    }
+
+def timed(function, items) -> tuple[list, list[float]]:
+    results = []
+    latencies_ms = []
+    for item in items:
+        started_at = time.perf_counter()
+        results.append(function(item))
+        latencies_ms.append((time.perf_counter() - started_at) * 1000)
+    return results, latencies_ms
+
+def bucket_name(bounds: list[int], index: int) -> str:
+    lower = bounds[index - 1] if index > 0 else 0
+    upper = bounds[index] if index < len(bounds) else None
+    return f"{lower}-{upper}" if upper is not None else f"{lower}+"
+
+def sample_corpus(paths: list[str], sample_size: int, bounds: list[int], seed: int) -> dict[str, list[str]]:
+    texts = list(iter_corpus_texts(paths))
+    random.Random(seed).shuffle(texts)
+    buckets = {bucket_name(bounds, i): [] for i in range(len(bounds) + 1)}
+    for text in texts:
+        index = sum(len(text) >= bound for bound in bounds)
+        bucket = buckets[bucket_name(bounds, index)]
+        if len(bucket) < sample_size:
+            bucket.append(text)
+    return buckets
+
+def benchmark_stages(buckets: dict[str, list[str]], model_ids: list[str]) -> dict:
+    report = {}
+    for name, texts in buckets.items():
+        if not texts:
+            continue
+        bucket_report = {"texts": len(texts), "mean_chars": float(np.mean([len(text) for text in texts]))}
+
+        rss_before_mb = ml_utils.current_rss_mb()
+        preprocessed_texts, latencies = timed(ml_utils.preprocess_text, texts)
+        bucket_report["preprocess"] = {**latency_summary(latencies), "rss_mb": stage_rss_mb(rss_before_mb)}
+
+        preprocessed_texts = [text for text in preprocessed_texts if text.strip()]
+        vectors_by_path = {}
+        for model_id in model_ids:
+            model_spec = model_registry.get_spec(model_id)
+            vectorizer, model = ml_utils.get_model_components(model_spec)
+            if model_spec["vectorizer_path"] not in vectors_by_path:
+                # Векторизатор, общий для нескольких моделей, замеряется один раз
+                stage_name = "vectorize" if not vectors_by_path else f"vectorize_{model_id}"
+                rss_before_mb = ml_utils.current_rss_mb()
+                text_vectors, latencies = timed(lambda text: vectorizer.transform([text]), preprocessed_texts)
+                vectors_by_path[model_spec["vectorizer_path"]] = text_vectors
+                bucket_report[stage_name] = {**latency_summary(latencies), "rss_mb": stage_rss_mb(rss_before_mb)}
+
+            rss_before_mb = ml_utils.current_rss_mb()
+            _, latencies = timed(lambda vector: ml_utils.score_text_vectors(model, model_spec, vector),
+                                 vectors_by_path[model_spec["vectorizer_path"]])
+            bucket_report[f"predict_{model_id}"] = {**latency_summary(latencies), "rss_mb": stage_rss_mb(rss_before_mb)}
+        report[name] = bucket_report
+        logging.info(f"Бакет {name}: {json.dumps(bucket_report, ensure_ascii=False)}")
+    return report
+
+def build_long_documents(texts: list[str], length: int, count: int, seed: int) -> list[str]:
+    # Длинный документ - склейка случайных статей корпуса, как пересланная лента сообщений
+    rng = random.Random(seed + length)
+    documents = []
+    for _ in range(count):
+        parts = []
+        total_length = 0
+        while total_length < length:
+            parts.append(rng.choice(texts))
+            total_length += len(parts[-1]) + 1
+        documents.append(" ".join(parts)[:length])
+    return documents
+
+def benchmark_long_documents(texts: list[str], model_ids: list[str], lengths: list[int], samples: int,
+                             seed: int) -> dict:
+    """
+    Compares whole-text inference with chunked inference (score_chunked_text) on synthetic long documents.
+    """
+    report = {}
+    for length in lengths:
+        documents = build_long_documents(texts, length, samples, seed)
+        length_report = {}
+        for model_id in model_ids:
+            model_spec = model_registry.get_spec(model_id)
+            vectorizer, model = ml_utils.get_model_components(model_spec)
+
+            def predict_whole(document: str):
+                text_vector = vectorizer.transform([ml_utils.preprocess_text(document)])
+                return ml_utils.score_text_vectors(model, model_spec, text_vector)
+
+            rss_before_mb = ml_utils.current_rss_mb()
+            _, latencies = timed(predict_whole, documents)
+            length_report[f"whole_{model_id}"] = {**latency_summary(latencies), "rss_mb": stage_rss_mb(rss_before_mb)}
+            rss_before_mb = ml_utils.current_rss_mb()
+            chunked_results, latencies = timed(
+                lambda document: ml_utils.score_chunked_text(document, [model_spec], [(vectorizer, model)]), documents)
+            length_report[f"chunked_{model_id}"] = {
+                **latency_summary(latencies),
+                "mean_chunks": float(np.mean([stage_timings["chunks"] for _, stage_timings in chunked_results])),
+                "rss_mb": stage_rss_mb(rss_before_mb),
+            }
+        report[f"{length}_chars"] = length_report
+        logging.info(f"Длинные документы {length} символов: {json.dumps(length_report, ensure_ascii=False)}")
+    return report
+
+def benchmark_window_accuracy(paths: list[str], model_ids: list[str], limit: int | None) -> dict:
+    """
+    Compares whole-text and windowed (score_chunked_text) accuracy on the fake-news.ipynb test split.
+    """
+    texts, labels = notebook_test_split(paths)
+    if limit is not None:
+        # train_test_split уже перемешал строки, первые N - случайная подвыборка теста
+        texts, labels = texts[:limit], labels[:limit]
+    if not texts:
+        logging.warning("Тестовая выборка ноутбука пуста, точность по окнам не оценена.")
+        return {}
+
+    report = {"test_rows": len(texts)}
+    for model_id in model_ids:
+        model_spec = model_registry.get_spec(model_id)
+        vectorizer, model = ml_utils.get_model_components(model_spec)
+        whole_predictions, _ = ml_utils.score_text_vectors(
+            model, model_spec, vectorizer.transform([ml_utils.preprocess_text(text) for text in texts]))
+        windowed_predictions = []
+        chunks = []
+        for text in texts:
+            [(label, _)], stage_timings = ml_utils.score_chunked_text(text, [model_spec], [(vectorizer, model)])
+            windowed_predictions.append(1 if label == ml_utils.FAKE_LABEL else 0)
+            chunks.append(stage_timings["chunks"])
+        windowed_predictions = np.asarray(windowed_predictions)
+        whole_predictions = np.asarray(whole_predictions)
+        report[model_id] = {
+            "whole_accuracy": float(np.mean(whole_predictions == labels)),
+            "windowed_accuracy": float(np.mean(windowed_predictions == labels)),
+            "agreement": float(np.mean(whole_predictions == windowed_predictions)),
+            "mean_chunks": float(np.mean(chunks)),
+        }
+        logging.info(f"Точность целиком против окон ({model_id}): {json.dumps(report[model_id], ensure_ascii=False)}")
+    return report
+
+async def benchmark_concurrency(texts: list[str], model_ids: list[str], concurrency_levels: list[int]) -> dict:
+    await ml_utils.start_inference_executor()
+    report = {}
+    try:
+        for model_id in model_ids:
+            for concurrency in concurrency_levels:
+                semaphore = asyncio.Semaphore(concurrency)
+                latencies = []
+
+                async def timed_prediction(text: str):
+                    async with semaphore:
+                        started_at = time.perf_counter()
+                        await ml_utils.predict_fake_news(text, model_id)
+                        latencies.append((time.perf_counter() - started_at) * 1000)
+
+                rss_before_mb = ml_utils.current_rss_mb()
+                started_at = time.perf_counter()
+                await asyncio.gather(*(timed_prediction(text) for text in texts))
+                elapsed_seconds = time.perf_counter() - started_at
+                key = f"predict_fake_news_{model_id}_c{concurrency}"
+                # Только основной процесс: модели в воркерах пула загружены до замера
+                report[key] = {**latency_summary(latencies, elapsed_seconds), "rss_mb": stage_rss_mb(rss_before_mb)}
+                logging.info(f"{key}: {json.dumps(report[key], ensure_ascii=False)}")
+    finally:
+        ml_utils.shutdown_inference_executor()
+    return report
+
+def compare_reports(current: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+
+    def walk(current_node: dict, baseline_node: dict, path: str):
+        for key, value in current_node.items():
+            baseline_value = baseline_node.get(key) if isinstance(baseline_node, dict) else None
+            if isinstance(value, dict):
+                walk(value, baseline_value or {}, f"{path}/{key}")
+            elif key in ("p50_ms", "p95_ms", "p99_ms") and baseline_value:
+                change = (value - baseline_value) / baseline_value
+                line = f"{path}/{key}: {baseline_value:.2f} -> {value:.2f} мс ({change:+.1%})"
+                print(line)
+                if change > threshold:
+                    regressions.append(line)
+
+    walk(current["results"], baseline.get("results", {}), "")
+    return regressions
+
+def run_benchmark(args) -> dict:
+    ml_utils.load_ml_components()
+    buckets = sample_corpus(args.corpus, args.sample_size, args.length_buckets, args.seed)
+    results = {"stages": benchmark_stages(buckets, args.model)}
+    if args.long_lengths:
+        corpus_texts = [text for texts in buckets.values() for text in texts]
+        results["long_documents"] = benchmark_long_documents(corpus_texts, args.model, args.long_lengths,
+                                                             args.long_samples, args.seed)
+    if args.window_accuracy:
+        results["window_accuracy"] = benchmark_window_accuracy(args.corpus, args.model, args.window_accuracy_limit)
+    if args.concurrency:
+        concurrency_texts = [text for texts in buckets.values() for text in texts]
+        results["concurrency"] = asyncio.run(benchmark_concurrency(concurrency_texts, args.model, args.concurrency))
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": {model_id: {"version": model_registry.model_version(model_id),
+                                  "path": model_registry.get_spec(model_id)["path"],
+                                  "vectorizer_path": model_registry.get_spec(model_id)["vectorizer_path"]}
+                       for model_id in args.model},
+            "inference_workers": INFERENCE_WORKERS,
+            "inference_batch_max_size": INFERENCE_BATCH_MAX_SIZE,
+            "inference_batch_window_ms": INFERENCE_BATCH_WINDOW_MS,
+            "chunked_inference": {
+                "min_chars": CHUNKED_INFERENCE_MIN_CHARS,
+                "window_words": CHUNK_WINDOW_WORDS,
+                "max_windows": CHUNK_MAX_WINDOWS,
+                "group_size": CHUNK_GROUP_SIZE,
+                "aggregation": CHUNK_AGGREGATION,
+                "early_exit_confidence": CHUNK_EARLY_EXIT_CONFIDENCE,
+            },
+        },
+        "parameters": {
+            "corpus": args.corpus,
+            "sample_size": args.sample_size,
+            "length_buckets": args.length_buckets,
+            "concurrency": args.concurrency,
+            "long_lengths": args.long_lengths,
+            "long_samples": args.long_samples,
+            "window_accuracy": args.window_accuracy,
+            "window_accuracy_limit": args.window_accuracy_limit,
+            "models": args.model,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пути предсказания: задержки p50/p95/p99, пропускная "
+                                                 "способность и пиковый RSS по стадиям.")
+    parser.add_argument("--corpus", nargs="+", default=DEFAULT_CORPUS_FILES)
+    parser.add_argument("--sample-size", type=int, default=200, help="Текстов в каждом бакете длины")
+    parser.add_argument("--length-buckets", type=int, nargs="+", default=DEFAULT_LENGTH_BUCKETS,
+                        help="Границы бакетов по длине текста в символах")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=DEFAULT_CONCURRENCY_LEVELS,
+                        help="Уровни конкурентности для predict_fake_news (пусто - не запускать)")
+    parser.add_argument("--long-lengths", type=int, nargs="*", default=DEFAULT_LONG_DOCUMENT_LENGTHS,
+                        help="Длины синтетических длинных документов в символах: целиком против окон (пусто - не запускать)")
+    parser.add_argument("--long-samples", type=int, default=5, help="Документов каждой длины")
+    parser.add_argument("--window-accuracy", action="store_true",
+                        help="Сравнить точность целиком и по окнам на тестовой выборке fake-news.ipynb "
+                             "(--corpus - Fake.csv и True.csv)")
+    parser.add_argument("--window-accuracy-limit", type=int, default=2000,
+                        help="Текстов тестовой выборки для сравнения точности")
+    parser.add_argument("--model", action="append", choices=list(MODELS_CONFIG), default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help=f"JSON с результатами (по умолчанию {BENCHMARK_DIR}/<время>.json)")
+    parser.add_argument("--compare", default=None, help="JSON базового прогона для сравнения")
+    parser.add_argument("--regression-threshold", type=float, default=0.1,
+                        help="Относительный рост перцентиля, считающийся регрессией")
+    args = parser.parse_args()
+    args.model = args.model or list(MODELS_CONFIG)
+
+    setup_logging()
+    report = run_benchmark(args)
+
+    output_path = args.output or os.path.join(BENCHMARK_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, ensure_ascii=False, indent=2)
+    logging.info(f"Результаты сохранены в {output_path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            regressions = compare_reports(report, json.load(baseline_file), args.regression_threshold)
+        if regressions:
+            logging.warning(f"Регрессии относительно {args.compare}: {len(regressions)}")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
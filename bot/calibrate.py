@@ -0,0 +1,67 @@
+import argparse
+import json
+import logging
+
+import joblib
+import numpy as np
+
+from . import ml_utils
+from .check_preprocessing import DEFAULT_CORPUS_FILES
+from .compact_vectorizer import load_vectorizer
+from .config import setup_logging
+from .holdout import notebook_test_split
+from .model_registry import default_model_specs
+from .train import fit_platt_calibration
+
+
+def log_loss(positive_probabilities: np.ndarray, labels: np.ndarray) -> float:
+    positive_probabilities = np.clip(positive_probabilities, 1e-15, 1 - 1e-15)
+    return float(-np.mean(labels * np.log(positive_probabilities) + (1 - labels) * np.log(1 - positive_probabilities)))
+
+def platt_probabilities(scores: np.ndarray, calibration: dict) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(calibration["a"] * scores + calibration["b"]))
+
+def calibrate_model(model_id: str, paths: list[str]) -> dict:
+    """
+    Fits Platt a/b for a model without predict_proba on the notebook test split and compares it with the current one.
+    """
+    model_spec = default_model_specs()[model_id]
+    model = joblib.load(model_spec["path"])
+    if hasattr(model, "predict_proba"):
+        raise ValueError(f"Модель {model_id} выдает вероятности сама, калибровка Платта не нужна")
+    vectorizer = load_vectorizer(model_spec["vectorizer_path"])
+
+    texts, labels = notebook_test_split(paths)
+    if not texts:
+        raise ValueError("Тестовая выборка ноутбука пуста")
+    scores = model.decision_function(vectorizer.transform([ml_utils.preprocess_text(text) for text in texts]))
+    current_calibration = model_spec.get("calibration", ml_utils.DEFAULT_DECISION_CALIBRATION)
+    fitted_calibration = fit_platt_calibration(scores, labels)
+    predictions = model.classes_[(scores > 0).astype(int)]
+    return {
+        "model_id": model_id,
+        "test_rows": len(labels),
+        "accuracy": float(np.mean(predictions == labels)),
+        "current": {"calibration": current_calibration,
+                    "log_loss": log_loss(platt_probabilities(scores, current_calibration), labels)},
+        "fitted": {"calibration": fitted_calibration,
+                   "log_loss": log_loss(platt_probabilities(scores, fitted_calibration), labels)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор сигмоиды Платта для LinearSVC по тестовой выборке "
+                                                 "fake-news.ipynb (те же очистка, RANDOM_STATE и stratify).")
+    parser.add_argument("--model-id", default="linear_svc")
+    parser.add_argument("--corpus", nargs="+", default=DEFAULT_CORPUS_FILES, help="Fake.csv и True.csv ноутбука")
+    args = parser.parse_args()
+
+    setup_logging()
+    ml_utils.load_nltk_components()
+    result = calibrate_model(args.model_id, args.corpus)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    fitted_calibration = result["fitted"]["calibration"]
+    logging.info(f"Для применения задайте {args.model_id.upper()}_CALIBRATION="
+                 f"{fitted_calibration['a']:.6g},{fitted_calibration['b']:.6g}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import csv
+import logging
+import sys
+
+from .config import setup_logging
+from .ml_utils import load_nltk_components, preprocess_text, preprocess_text_reference
+
+
+DEFAULT_CORPUS_FILES = ["data/Fake.csv", "data/True.csv"]
+# Встроенные примеры на случаи, которые обрабатывают регулярки и таблица translate в preprocess_text:
+# проверяются без корпуса (LFS-файлы data/*.csv есть не везде)
+PARITY_SAMPLES = [
+    "",
+    "The President's statement, released on Monday, was \"unbelievable\"!",
+    "Officials said: 3 people (aged 25-40) were hurt; 2017 was worse... #breaking @reuters",
+    "U.S. stocks fell 2.5% to $1,200 on covid19 fears in the 1990s-style crash",
+    "We cannot and won't stop; they're gonna wanna know, gimme a break, lemme see, gotta go",
+    "I can not believe it's O'Neil's dog — isn't it?",
+    "«Fake» news: “quoted” and ‘single’ quotes, „low“ quotes and it’s typographic",
+    "Running runners ran; studies studied the wolves, geese and children's leaves",
+    "The and of to in is was were been being have has had do does did",
+    "Ünïcödé café naïve résumé — emoji 🤥 and tabs\tand\nnewlines",
+    "http://example.com/path?query=1 e-mail: someone@example.com",
+]
+
+def iter_corpus_texts(paths: list[str], limit: int | None = None):
+    csv.field_size_limit(sys.maxsize)
+    yielded = 0
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as corpus_file:
+            for row in csv.DictReader(corpus_file):
+                if limit is not None and yielded >= limit:
+                    return
+                yield f"{row.get('title', '')} {row.get('text', '')}"
+                yielded += 1
+
+def check_preprocessing_parity(paths: list[str], limit: int | None = None, max_reported: int = 5) -> int:
+    """
+    Compares preprocess_text with the reference word_tokenize implementation, returns the mismatch count.
+    """
+    checked = 0
+    mismatches = 0
+    for text in iter_corpus_texts(paths, limit):
+        checked += 1
+        fast_result = preprocess_text(text)
+        reference_result = preprocess_text_reference(text)
+        if fast_result != reference_result:
+            mismatches += 1
+            if mismatches <= max_reported:
+                logging.error(f"Расхождение предобработки для текста '{text[:100]}...':\n"
+                              f"  preprocess_text:           '{fast_result[:200]}'\n"
+                              f"  preprocess_text_reference: '{reference_result[:200]}'")
+    logging.info(f"Проверено текстов: {checked}, расхождений: {mismatches}")
+    return mismatches
+
+def check_sample_parity(max_reported: int = 5) -> int:
+    """
+    Runs the parity check on the inline PARITY_SAMPLES, returns the mismatch count.
+    """
+    mismatches = 0
+    for text in PARITY_SAMPLES:
+        fast_result = preprocess_text(text)
+        reference_result = preprocess_text_reference(text)
+        if fast_result != reference_result:
+            mismatches += 1
+            if mismatches <= max_reported:
+                logging.error(f"Расхождение предобработки для примера '{text}':\n"
+                              f"  preprocess_text:           '{fast_result}'\n"
+                              f"  preprocess_text_reference: '{reference_result}'")
+    logging.info(f"Проверено встроенных примеров: {len(PARITY_SAMPLES)}, расхождений: {mismatches}")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка эквивалентности быстрой предобработки текста и эталонной (NLTK word_tokenize).")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_CORPUS_FILES, help="CSV-файлы корпуса с колонками title и text")
+    parser.add_argument("--limit", type=int, default=None, help="Максимальное количество проверяемых текстов")
+    parser.add_argument("--samples-only", action="store_true",
+                        help="Проверить только встроенные примеры, без корпуса (выполняется при сборке образа)")
+    args = parser.parse_args()
+
+    setup_logging()
+    load_nltk_components()
+    mismatches = check_sample_parity()
+    if not args.samples_only:
+        mismatches += check_preprocessing_parity(args.paths, args.limit)
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
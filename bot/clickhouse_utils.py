@@ -1,101 +1,529 @@
+import asyncio
+import hashlib
+import json
 import logging
+import os
+import queue
+import threading
+import time
 import uuid
-from clickhouse_driver import Client
-from .config import CH_HOST, CH_PORT, CH_USER, CH_PASSWORD, CH_DB, MODELS_CONFIG
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from clickhouse_driver import Client, errors
+from .config import (CH_HOST, CH_PORT, CH_USER, CH_PASSWORD, CH_DB, MODELS_CONFIG,
+                     CH_WRITER_BATCH_SIZE, CH_WRITER_FLUSH_INTERVAL_SECONDS, CH_WRITER_MAX_QUEUE_SIZE,
+                     CH_WRITER_MAX_RETRIES, CH_WRITER_SPILL_PATH, CH_WRITER_SPILL_MAX_BYTES,
+                     CH_POOL_SIZE, CH_HEALTH_CHECK_INTERVAL_SECONDS, CH_POOL_CHECKOUT_TIMEOUT_SECONDS,
+                     CH_RECONNECT_MAX_BACKOFF_SECONDS)
+from .metrics import DB_FLUSH_LATENCY, DB_QUEUE_SIZE, DB_DROPPED_ROWS
 
 
-db_client_instance = None
+REQUESTS_LOG_COLUMNS = ("request_id", "user_id", "chat_id", "message_id", "text_hash", "predicted_label",
+                        "prediction_probability", "model_version", "processing_time_ms", "is_cached",
+                        "queue_wait_ms", "preprocess_ms", "vectorize_ms", "predict_ms", "telegram_ms",
+                        "request_group_id")
+# Поэтапные задержки обработки запроса, хранящиеся в отдельных колонках requests_log
+STAGE_TIMING_COLUMNS = ("queue_wait_ms", "preprocess_ms", "vectorize_ms", "predict_ms", "telegram_ms")
+FEEDBACK_COLUMNS = ("request_id", "user_id", "user_rating")
+# Тексты новостей хранятся один раз в news_texts, requests_log ссылается на них по text_hash
+NEWS_TEXTS_COLUMNS = ("text_hash", "news_text")
+# Сколько недавно записанных хешей помнить, чтобы не отправлять один и тот же текст повторно
+RECENT_TEXT_HASHES_SIZE = 100000
+# Колонки, которые при сериализации в spill-файл превращаются в строки и восстанавливаются при чтении
+UUID_COLUMNS = {"request_id", "request_group_id"}
 
-def get_clickhouse_client():
-    global db_client_instance
-    reconnect_needed = False
+def create_clickhouse_client() -> Client:
+    return Client(
+        host=CH_HOST, port=CH_PORT, user=CH_USER, password=CH_PASSWORD, database=CH_DB,
+        connect_timeout=10, send_receive_timeout=300,
+        settings={'max_block_size': 100000}
+    )
 
-    if db_client_instance is None:
-        reconnect_needed = True
-    else:
+def news_text_hash(news_text: str) -> int:
+    """
+    Content address of a news text: the first 8 bytes of its SHA-256 as little-endian UInt64.
+
+    Matches reinterpretAsUInt64(substring(SHA256(news_text), 1, 8)) in ClickHouse, which the backfill uses.
+    """
+    return int.from_bytes(hashlib.sha256(news_text.encode("utf-8")).digest()[:8], "little")
+
+class ClickHouseConnectionPool:
+    """
+    Thread-safe pool of ClickHouse clients with lazy health checks and reconnect backoff.
+
+    Idle clients are pinged only if unused for longer than the health check interval;
+    a client that fails with a non-server error is discarded instead of being returned.
+    """
+    def __init__(self, size: int, health_check_interval_seconds: float, checkout_timeout_seconds: float,
+                 max_backoff_seconds: float):
+        self.size = size
+        self.health_check_interval_seconds = health_check_interval_seconds
+        self.checkout_timeout_seconds = checkout_timeout_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._backoff_lock = threading.Lock()
+        self._backoff_seconds = 0.0
+        self._next_connect_at = 0.0
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.checkout_timeout_seconds):
+            raise TimeoutError(f"Нет свободных соединений с ClickHouse за {self.checkout_timeout_seconds} с")
+        client = None
         try:
-            db_client_instance.execute("SELECT 1")
+            client = self._checkout()
+            yield client
         except Exception as e:
-            logging.warning(f"Соединение с ClickHouse потеряно или недействительно: {e}. Попытка переподключения.")
-            reconnect_needed = True
-            if db_client_instance and getattr(db_client_instance, 'connection', None): # Проверка атрибута connection
-                try:
-                    db_client_instance.disconnect()
-                except Exception:
-                    pass
-            db_client_instance = None
+            if client is not None and not isinstance(e, errors.ServerException):
+                self._discard(client)
+                client = None
+            raise
+        finally:
+            if client is not None:
+                self._idle.put((client, time.monotonic()))
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(client)
+
+    def _checkout(self) -> Client:
+        try:
+            client, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+        if time.monotonic() - last_used < self.health_check_interval_seconds:
+            return client
+        try:
+            client.execute("SELECT 1")
+            return client
+        except Exception as e:
+            logging.warning(f"Соединение с ClickHouse не прошло проверку: {e}. Переподключение.")
+            self._discard(client)
+            return self._connect()
+
+    def _connect(self) -> Client:
+        with self._backoff_lock:
+            wait_seconds = self._next_connect_at - time.monotonic()
+        if wait_seconds > 0:
+            raise ConnectionError(f"Переподключение к ClickHouse отложено еще на {wait_seconds:.1f} с")
 
-    if reconnect_needed:
         try:
             logging.info(f"Попытка подключения к ClickHouse ({CH_HOST}:{CH_PORT}, БД: {CH_DB})...")
-            db_client_instance = Client(
-                host=CH_HOST, port=CH_PORT, user=CH_USER, password=CH_PASSWORD, database=CH_DB,
-                connect_timeout=10, send_receive_timeout=300,
-                settings={'max_block_size': 100000}
-            )
-            db_client_instance.execute("SELECT 1")
-            logging.info(f"Успешное новое подключение к ClickHouse ({CH_HOST}:{CH_PORT}, БД: {CH_DB})")
+            client = create_clickhouse_client()
+            client.execute("SELECT 1")
         except Exception as e:
-            logging.error(f"Ошибка нового подключения к ClickHouse: {e}", exc_info=True)
-            db_client_instance = None
-    return db_client_instance
+            with self._backoff_lock:
+                self._backoff_seconds = min(max(self._backoff_seconds * 2, 1.0), self.max_backoff_seconds)
+                self._next_connect_at = time.monotonic() + self._backoff_seconds
+            logging.error(f"Ошибка подключения к ClickHouse: {e}. Следующая попытка через {self._backoff_seconds:.1f} с.")
+            raise
+
+        with self._backoff_lock:
+            self._backoff_seconds = 0.0
+            self._next_connect_at = 0.0
+        logging.info(f"Успешное новое подключение к ClickHouse ({CH_HOST}:{CH_PORT}, БД: {CH_DB})")
+        return client
+
+    @staticmethod
+    def _discard(client: Client):
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+
+clickhouse_pool = ClickHouseConnectionPool(
+    size=CH_POOL_SIZE,
+    health_check_interval_seconds=CH_HEALTH_CHECK_INTERVAL_SECONDS,
+    checkout_timeout_seconds=CH_POOL_CHECKOUT_TIMEOUT_SECONDS,
+    max_backoff_seconds=CH_RECONNECT_MAX_BACKOFF_SECONDS,
+)
+
+def execute_query(query: str, params=None):
+    with clickhouse_pool.connection() as client:
+        return client.execute(query, params)
+
+async def execute_query_async(query: str, params=None):
+    # Запросы выполняются в потоках, каждый на своем соединении из пула
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, execute_query, query, params)
+
+def check_clickhouse_connection() -> bool:
+    try:
+        execute_query("SELECT 1")
+        return True
+    except Exception as e:
+        logging.error(f"ClickHouse недоступен: {e}")
+        return False
+
+class BufferedClickHouseWriter:
+    """
+    Queues rows per table and inserts them in batches from a background thread.
+
+    Batches that still fail after retries are appended to a bounded JSONL spill file
+    and replayed after the next successful flush.
+    """
+    def __init__(self, batch_size: int, flush_interval_seconds: float, max_queue_size: int,
+                 max_retries: int, spill_path: str, spill_max_bytes: int):
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.dropped_rows = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="clickhouse-writer", daemon=True)
+        self._thread.start()
+        logging.info(f"Фоновая запись в ClickHouse запущена (батч {self.batch_size}, интервал {self.flush_interval_seconds} с).")
+
+    def stop(self, timeout: float | None = 30):
+        if not self.is_running:
+            return
+        logging.info(f"Остановка фоновой записи в ClickHouse, в очереди {self.queue_size()} строк...")
+        self._stop_event.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.error("Фоновая запись в ClickHouse не завершилась за отведенное время.")
+        self._thread = None
+
+    def enqueue(self, table: str, columns: tuple, row: dict):
+        try:
+            self._queue.put_nowait((table, columns, row))
+        except queue.Full:
+            logging.warning(f"Очередь записи в ClickHouse переполнена, строка для {table} сохраняется на диск.")
+            self._spill(table, columns, [row])
+
+    def _run(self):
+        pending = defaultdict(list)
+        pending_count = 0
+        last_flush = time.monotonic()
+        while True:
+            stopping = False
+            try:
+                timeout = max(0.0, self.flush_interval_seconds - (time.monotonic() - last_flush))
+                try:
+                    table, columns, row = self._queue.get(timeout=timeout)
+                    pending[(table, columns)].append(row)
+                    pending_count += 1
+                except queue.Empty:
+                    pass
+
+                stopping = self._stop_event.is_set() and self._queue.empty()
+                interval_elapsed = time.monotonic() - last_flush >= self.flush_interval_seconds
+                if pending_count >= self.batch_size or interval_elapsed or stopping:
+                    if pending_count and self._flush(pending):
+                        self._replay_spill()
+                    pending = defaultdict(list)
+                    pending_count = 0
+                    last_flush = time.monotonic()
+            except Exception as e:
+                # Поток записи не должен умирать: иначе все дальнейшие записи пойдут синхронно из event loop
+                logging.error(f"Ошибка в потоке записи в ClickHouse: {e}", exc_info=True)
+                for (table, columns), rows in pending.items():
+                    self._spill(table, columns, rows)
+                pending = defaultdict(list)
+                pending_count = 0
+                last_flush = time.monotonic()
+            if stopping:
+                break
+
+    def _flush(self, pending: dict) -> bool:
+        all_inserted = True
+        for (table, columns), rows in pending.items():
+            if not self._insert_with_retry(table, columns, rows):
+                self._spill(table, columns, rows)
+                all_inserted = False
+        return all_inserted
+
+    def _insert_with_retry(self, table: str, columns: tuple, rows: list) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with DB_FLUSH_LATENCY.labels(table).time():
+                    execute_query(f"INSERT INTO {CH_DB}.{table} ({', '.join(columns)}) VALUES", rows)
+                logging.info(f"В {table} записано {len(rows)} строк.")
+                return True
+            except Exception as e:
+                logging.warning(f"Ошибка записи {len(rows)} строк в {table} (попытка {attempt + 1}): {e}")
+                if attempt < self.max_retries and not self._stop_event.is_set():
+                    time.sleep(min(0.5 * 2 ** attempt, 30))
+        return False
+
+    def _spill(self, table: str, columns: tuple, rows: list):
+        with self._spill_lock:
+            try:
+                spill_size = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+                if spill_size >= self.spill_max_bytes:
+                    self.dropped_rows += len(rows)
+                    logging.error(f"Spill-файл {self.spill_path} заполнен, {len(rows)} строк для {table} потеряно "
+                                  f"(всего потеряно: {self.dropped_rows}).")
+                    return
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                    for row in rows:
+                        serializable_row = {key: str(value) if key in UUID_COLUMNS else value for key, value in row.items()}
+                        spill_file.write(json.dumps({"table": table, "columns": columns, "row": serializable_row},
+                                                    ensure_ascii=False) + "\n")
+                logging.warning(f"{len(rows)} строк для {table} сохранено в {self.spill_path}.")
+            except Exception as e:
+                self.dropped_rows += len(rows)
+                logging.error(f"Не удалось сохранить строки для {table} на диск: {e}", exc_info=True)
+
+    def _replay_spill(self):
+        with self._spill_lock:
+            replay_path = f"{self.spill_path}.replay"
+            if not os.path.exists(self.spill_path) and not os.path.exists(replay_path):
+                return
+            # .replay, оставшийся после падения процесса, дочитывается первым, spill-файл - при следующем сбросе
+            if not os.path.exists(replay_path):
+                os.replace(self.spill_path, replay_path)
+
+        pending = defaultdict(list)
+        bad_lines = []
+        with open(replay_path, encoding="utf-8") as replay_file:
+            for line in replay_file:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    row = {key: uuid.UUID(value) if key in UUID_COLUMNS else value for key, value in record["row"].items()}
+                    pending[(record["table"], tuple(record["columns"]))].append(row)
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # Например, строка, недописанная при падении процесса
+                    bad_lines.append(line if line.endswith("\n") else line + "\n")
+        if bad_lines:
+            bad_path = f"{self.spill_path}.bad"
+            with open(bad_path, "a", encoding="utf-8") as bad_file:
+                bad_file.writelines(bad_lines)
+            logging.warning(f"В spill-файле {len(bad_lines)} поврежденных строк, они перенесены в {bad_path}.")
+        os.remove(replay_path)
+        logging.info(f"Повторная запись строк из spill-файла: {sum(len(rows) for rows in pending.values())}.")
+        # Непрошедшие строки снова окажутся в spill-файле
+        self._flush(pending)
+
+
+clickhouse_writer = BufferedClickHouseWriter(
+    batch_size=CH_WRITER_BATCH_SIZE,
+    flush_interval_seconds=CH_WRITER_FLUSH_INTERVAL_SECONDS,
+    max_queue_size=CH_WRITER_MAX_QUEUE_SIZE,
+    max_retries=CH_WRITER_MAX_RETRIES,
+    spill_path=CH_WRITER_SPILL_PATH,
+    spill_max_bytes=CH_WRITER_SPILL_MAX_BYTES,
+)
+DB_QUEUE_SIZE.set_function(clickhouse_writer.queue_size)
+DB_DROPPED_ROWS.set_function(lambda: clickhouse_writer.dropped_rows)
+
+# Хеш текста -> день последней записи: last_seen в news_texts обновляется не чаще раза в сутки
+_recent_text_hashes = OrderedDict()
+
+def news_text_rows(news_texts: list[str]) -> list[dict]:
+    """
+    Returns news_texts rows for texts not yet written today by this process.
+    """
+    today = time.strftime("%Y-%m-%d")
+    rows = []
+    for news_text in news_texts:
+        text_hash = news_text_hash(news_text)
+        if _recent_text_hashes.get(text_hash) == today:
+            _recent_text_hashes.move_to_end(text_hash)
+            continue
+        _recent_text_hashes[text_hash] = today
+        _recent_text_hashes.move_to_end(text_hash)
+        rows.append({"text_hash": text_hash, "news_text": news_text})
+    while len(_recent_text_hashes) > RECENT_TEXT_HASHES_SIZE:
+        _recent_text_hashes.popitem(last=False)
+    return rows
+
+def _write_rows(table: str, columns: tuple, rows: list) -> bool:
+    if clickhouse_writer.is_running:
+        for row in rows:
+            clickhouse_writer.enqueue(table, columns, row)
+        return True
+
+    # Без фонового писателя (например, в CLI-скриптах) пишем синхронно
+    try:
+        execute_query(f"INSERT INTO {CH_DB}.{table} ({', '.join(columns)}) VALUES", rows)
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка записи в {table}: {e}", exc_info=True)
+        return False
+
+def _write_news_texts(news_texts: list[str]) -> bool:
+    text_rows = news_text_rows(news_texts)
+    if not text_rows or _write_rows("news_texts", NEWS_TEXTS_COLUMNS, text_rows):
+        return True
+    # Незаписанные тексты будут отправлены снова со следующим запросом
+    for row in text_rows:
+        _recent_text_hashes.pop(row["text_hash"], None)
+    return False
 
 async def log_request_to_db(user_id: int, chat_id: int, message_id: int,
                             news_text: str, predicted_label: str,
                             probability: float | None, processing_time_ms: int,
-                            selected_model_id: str) -> str | None:
-    client = get_clickhouse_client()
-    if not client:
-        logging.warning("Нет подключения к БД, логирование запроса пропускается.")
-        return None
-
-    request_id_uuid = uuid.uuid4()
+                            selected_model_id: str, is_cached: bool = False,
+                            stage_timings: dict | None = None, request_id: str | None = None,
+                            model_version: str | None = None) -> str | None:
+    # request_id может быть выдан заранее, чтобы кнопки фидбека ушли пользователю до записи в БД
+    request_id_uuid = uuid.UUID(request_id) if request_id else uuid.uuid4()
     request_id_str = str(request_id_uuid)
-    # Используем MODELS_CONFIG из импортированного config.py
-    model_version_to_log = MODELS_CONFIG.get(selected_model_id, {}).get("name", selected_model_id)
-
+    stage_timings = stage_timings or {}
+    # Точная версия модели, которой получено предсказание; без нее - название модели из MODELS_CONFIG
+    model_version_to_log = model_version or MODELS_CONFIG.get(selected_model_id, {}).get("name", selected_model_id)
 
-    data_to_insert = [{
+    row = {
         "request_id": request_id_uuid,
         "user_id": user_id,
         "chat_id": chat_id,
         "message_id": message_id,
-        "news_text": news_text,
+        "text_hash": news_text_hash(news_text),
         "predicted_label": predicted_label,
         "prediction_probability": probability if probability is not None else 0.0,
         "model_version": model_version_to_log,
-        "processing_time_ms": processing_time_ms
-    }]
-    columns = "(request_id, user_id, chat_id, message_id, news_text, predicted_label, prediction_probability, model_version, processing_time_ms)"
+        "processing_time_ms": processing_time_ms,
+        "is_cached": int(is_cached),
+        **{column: float(stage_timings.get(column) or 0.0) for column in STAGE_TIMING_COLUMNS},
+        # Одиночный запрос - группа из одной строки
+        "request_group_id": request_id_uuid,
+    }
+    # Текст пишется раньше ссылающейся на него строки
+    if not _write_news_texts([news_text]):
+        return None
+    if not _write_rows("requests_log", REQUESTS_LOG_COLUMNS, [row]):
+        return None
+    logging.info(f"Запрос {request_id_str} (модель: {model_version_to_log}) поставлен в очередь записи в БД.")
+    return request_id_str
+
+async def log_request_group_to_db(user_id: int, chat_id: int, message_id: int, news_text: str,
+                                  prediction: dict, processing_time_ms: int,
+                                  stage_timings: dict | None = None, request_group_id: str | None = None) -> str | None:
+    """
+    Logs a predict_all result: a row per model plus a row with the combined verdict, sharing request_group_id.
+
+    The combined row's request_id equals request_group_id, so feedback on the verdict joins to it directly.
+    """
+    request_group_uuid = uuid.UUID(request_group_id) if request_group_id else uuid.uuid4()
+    stage_timings = stage_timings or {}
+    timing_values = {column: float(stage_timings.get(column) or 0.0) for column in STAGE_TIMING_COLUMNS}
+    text_hash = news_text_hash(news_text)
+
+    rows = []
+    results = [(uuid.uuid4(), result) for result in prediction["models"].values()]
+    results.append((request_group_uuid, prediction["combined"]))
+    for request_id_uuid, result in results:
+        rows.append({
+            "request_id": request_id_uuid,
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text_hash": text_hash,
+            "predicted_label": result["label"],
+            "prediction_probability": result["probability"] if result["probability"] is not None else 0.0,
+            "model_version": result["model_version"],
+            "processing_time_ms": processing_time_ms,
+            "is_cached": 0,
+            **timing_values,
+            "request_group_id": request_group_uuid,
+        })
+    if not _write_news_texts([news_text]):
+        return None
+    if not _write_rows("requests_log", REQUESTS_LOG_COLUMNS, rows):
+        return None
+    logging.info(f"Группа запросов {request_group_uuid} ({len(rows)} строк) поставлена в очередь записи в БД.")
+    return str(request_group_uuid)
+
+async def find_recent_prediction(news_text: str, model_version: str, max_age_seconds: int) -> tuple[str, float] | None:
+    # Ограничение по request_timestamp (первый столбец ORDER BY) сужает чтение до свежих гранул
+    query = f"""
+        SELECT predicted_label, prediction_probability
+        FROM {CH_DB}.requests_log
+        WHERE request_timestamp >= now() - toIntervalSecond(%(max_age)s)
+          AND model_version = %(model_version)s
+          AND prediction_probability > 0
+          AND text_hash = %(text_hash)s
+        ORDER BY request_timestamp DESC
+        LIMIT 1
+    """
     try:
-        client.execute(f"INSERT INTO {CH_DB}.requests_log {columns} VALUES", data_to_insert)
-        logging.info(f"Запрос {request_id_str} (модель: {model_version_to_log}) залогирован в БД.")
-        return request_id_str
+        rows = await execute_query_async(query, {"max_age": max_age_seconds, "model_version": model_version,
+                                                  "text_hash": news_text_hash(news_text)})
     except Exception as e:
-        logging.error(f"Ошибка логирования запроса {request_id_str} в БД: {e}", exc_info=True)
+        logging.error(f"Ошибка поиска недавнего предсказания в БД: {e}", exc_info=True)
+        return None
+    if not rows:
         return None
+    predicted_label, probability = rows[0]
+    return predicted_label, float(probability)
 
 async def log_feedback_to_db(request_id_str: str, user_id: int, user_rating: str):
-    client = get_clickhouse_client()
-    if not client:
-        logging.warning("Нет подключения к БД, логирование фидбека пропускается.")
-        return False
     try:
         request_id_uuid = uuid.UUID(request_id_str)
     except ValueError:
         logging.error(f"Неверный формат request_id для UUID: {request_id_str}")
         return False
 
-    data_to_insert = [{
+    row = {
         "request_id": request_id_uuid,
         "user_id": user_id,
         "user_rating": user_rating
-    }]
-    columns = "(request_id, user_id, user_rating)"
-    try:
-        client.execute(f"INSERT INTO {CH_DB}.feedback {columns} VALUES", data_to_insert)
-        logging.info(f"Фидбек для запроса {request_id_str} (оценка: {user_rating}) залогирован.")
-        return True
-    except Exception as e:
-        logging.error(f"Ошибка логирования фидбека для запроса {request_id_str} в БД: {e}", exc_info=True)
-        return False
\ No newline at end of file
+    }
+    if not _write_rows("feedback", FEEDBACK_COLUMNS, [row]):
+        return False
+    logging.info(f"Фидбек для запроса {request_id_str} (оценка: {user_rating}) поставлен в очередь записи в БД.")
+    return True
+
+async def fetch_model_stats(hours: int) -> list[dict]:
+    """
+    Reads per-model_version aggregates for the last `hours` hours from model_stats_hourly (see init_db.py).
+    """
+    # Чтение только предагрегированных строк: стоимость зависит от числа часов и версий, а не от размера лога
+    query = f"""
+        SELECT
+            model_version,
+            sum(requests) AS total_requests,
+            sum(cached_requests),
+            sumMap([predicted_label], [requests]),
+            sum(feedback_total),
+            sum(feedback_correct),
+            quantilesTDigestMerge(0.5, 0.95, 0.99)(processing_time_quantiles),
+            quantilesTDigestMerge(0.5, 0.95, 0.99)(predict_time_quantiles)
+        FROM {CH_DB}.model_stats_hourly
+        WHERE hour >= toStartOfHour(now() - toIntervalHour(%(hours)s))
+        GROUP BY model_version
+        ORDER BY total_requests DESC
+    """
+    rows = await execute_query_async(query, {"hours": hours})
+    return [
+        {
+            "model_version": model_version,
+            "requests": requests,
+            "cached_requests": cached_requests,
+            "labels": dict(zip(*labels)),
+            "feedback_total": feedback_total,
+            "feedback_correct": feedback_correct,
+            "processing_time_ms": dict(zip(("p50", "p95", "p99"), processing_time)),
+            "predict_time_ms": dict(zip(("p50", "p95", "p99"), predict_time)),
+        }
+        for (model_version, requests, cached_requests, labels, feedback_total, feedback_correct,
+             processing_time, predict_time) in rows
+    ]
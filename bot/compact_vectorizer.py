@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+from .config import setup_logging
+
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+HASHES_FILE = "term_hashes.npy"
+COLUMNS_FILE = "term_columns.npy"
+IDF_FILE = "idf.npy"
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def is_compact_vectorizer_path(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+def vectorizer_arrays(vectorizer) -> tuple[np.ndarray, np.ndarray, np.ndarray | None, dict]:
+    """
+    Returns (sorted term hashes, their columns, idf or None, meta) of a fitted TfidfVectorizer or a compact one.
+    """
+    if isinstance(vectorizer, CompactTfidfVectorizer):
+        return (np.asarray(vectorizer._hashes), np.asarray(vectorizer._columns),
+                np.asarray(vectorizer._idf) if vectorizer._idf is not None else None, dict(vectorizer.meta))
+
+    if vectorizer.analyzer != "word" or vectorizer.tokenizer is not None or vectorizer.preprocessor is not None:
+        raise ValueError("Поддерживаются только векторизаторы с analyzer='word' без собственных tokenizer/preprocessor")
+    if vectorizer.stop_words is not None:
+        raise ValueError("Векторизаторы со stop_words не поддерживаются компактным форматом")
+    # transform компактного формата не снимает диакритику и всегда считает в float64: иначе скоры тихо разойдутся
+    if vectorizer.strip_accents is not None:
+        raise ValueError("Векторизаторы со strip_accents не поддерживаются компактным форматом")
+    if np.dtype(vectorizer.dtype) != np.float64:
+        raise ValueError(f"Поддерживаются только векторизаторы с dtype=float64, получен {np.dtype(vectorizer.dtype)}")
+
+    terms = list(vectorizer.vocabulary_.keys())
+    hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+    columns = np.fromiter((vectorizer.vocabulary_[term] for term in terms), dtype=np.int32, count=len(terms))
+
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    columns = columns[order]
+    if np.any(hashes[1:] == hashes[:-1]):
+        raise ValueError("Коллизия 64-битных хешей терминов словаря, экспорт невозможен")
+
+    use_idf = bool(vectorizer.use_idf)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "n_features": len(vectorizer.vocabulary_),
+        "ngram_range": list(vectorizer.ngram_range),
+        "token_pattern": vectorizer.token_pattern,
+        "lowercase": bool(vectorizer.lowercase),
+        "binary": bool(vectorizer.binary),
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "use_idf": use_idf,
+        "norm": vectorizer.norm,
+    }
+    return hashes, columns, np.asarray(vectorizer.idf_, dtype=np.float64) if use_idf else None, meta
+
+def write_vectorizer_arrays(output_dir: str, hashes: np.ndarray, columns: np.ndarray, idf: np.ndarray | None,
+                            meta: dict):
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, HASHES_FILE), hashes)
+    np.save(os.path.join(output_dir, COLUMNS_FILE), columns)
+    if idf is not None:
+        np.save(os.path.join(output_dir, IDF_FILE), idf)
+    with open(os.path.join(output_dir, META_FILE), "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+def export_vectorizer(vectorizer, output_dir: str):
+    """
+    Stores a fitted word-level TfidfVectorizer as sorted 64-bit term hashes plus idf_ in .npy files.
+    """
+    write_vectorizer_arrays(output_dir, *vectorizer_arrays(vectorizer))
+    logging.info(f"Векторизатор экспортирован в {output_dir}: {len(vectorizer.vocabulary_)} признаков.")
+
+def export_pruned_vectorizer(vectorizer, kept_columns: np.ndarray, output_dir: str):
+    """
+    Stores only the kept columns of a vectorizer in the compact format, renumbered 0..len(kept_columns) - 1
+    in their original order.
+    """
+    hashes, columns, idf, meta = vectorizer_arrays(vectorizer)
+    kept_columns = np.sort(np.asarray(kept_columns, dtype=np.int32))
+    is_kept = np.isin(columns, kept_columns)
+    # Хеши остаются отсортированными, номера колонок сдвигаются к плотной нумерации
+    write_vectorizer_arrays(
+        output_dir,
+        hashes[is_kept],
+        np.searchsorted(kept_columns, columns[is_kept]).astype(np.int32),
+        idf[kept_columns] if idf is not None else None,
+        {**meta, "n_features": len(kept_columns)},
+    )
+    logging.info(f"Сокращенный векторизатор сохранен в {output_dir}: {len(kept_columns)} из {meta['n_features']} "
+                 f"признаков.")
+
+
+class CompactTfidfVectorizer:
+    """
+    Read-only TfidfVectorizer replacement backed by memory-mapped arrays shared between processes.
+    """
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата векторизатора: {meta.get('format_version')}")
+
+        self.path = path
+        self.meta = meta
+        self.n_features = meta["n_features"]
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.lowercase = meta["lowercase"]
+        self.binary = meta["binary"]
+        self.sublinear_tf = meta["sublinear_tf"]
+        self.norm = meta["norm"]
+        self._token_re = re.compile(meta["token_pattern"])
+        self._hashes = np.load(os.path.join(path, HASHES_FILE), mmap_mode="r")
+        self._columns = np.load(os.path.join(path, COLUMNS_FILE), mmap_mode="r")
+        self._idf = np.load(os.path.join(path, IDF_FILE), mmap_mode="r") if meta["use_idf"] else None
+
+    def _word_ngrams(self, document: str) -> list[str]:
+        # Повторяет CountVectorizer._word_ngrams
+        tokens = self._token_re.findall(document.lower() if self.lowercase else document)
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        original_tokens = tokens
+        tokens_count = len(original_tokens)
+        ngrams = list(original_tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n + 1, tokens_count + 1)):
+            for i in range(tokens_count - n + 1):
+                ngrams.append(" ".join(original_tokens[i: i + n]))
+        return ngrams
+
+    def transform(self, raw_documents) -> csr_matrix:
+        indptr = [0]
+        query_hashes = []
+        for document in raw_documents:
+            query_hashes.extend(term_hash(term) for term in self._word_ngrams(document))
+            indptr.append(len(query_hashes))
+
+        query_hashes = np.asarray(query_hashes, dtype=np.uint64)
+        positions = np.searchsorted(self._hashes, query_hashes)
+        positions_clipped = np.minimum(positions, len(self._hashes) - 1)
+        found = self._hashes[positions_clipped] == query_hashes
+
+        # Отбрасываем термины вне словаря, пересчитывая границы строк
+        found_before = np.concatenate(([0], np.cumsum(found)))
+        row_bounds = found_before[np.asarray(indptr)]
+        columns = np.asarray(self._columns[positions_clipped[found]], dtype=np.int32)
+
+        matrix = csr_matrix(
+            (np.ones(len(columns), dtype=np.float64), columns, row_bounds),
+            shape=(len(indptr) - 1, self.n_features),
+        )
+        matrix.sum_duplicates()
+
+        if self.binary:
+            matrix.data.fill(1.0)
+        if self.sublinear_tf:
+            np.log(matrix.data, matrix.data)
+            matrix.data += 1.0
+        if self._idf is not None:
+            matrix.data *= self._idf[matrix.indices]
+        if self.norm is not None:
+            matrix = normalize(matrix, norm=self.norm, copy=False)
+        return matrix
+
+
+def load_vectorizer(path: str):
+    if is_compact_vectorizer_path(path):
+        return CompactTfidfVectorizer(path)
+    return joblib.load(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт TfidfVectorizer в компактный memory-mapped формат.")
+    parser.add_argument("source", help="Путь к pickle-файлу векторизатора (например, models/vectorizer_new.pkl)")
+    parser.add_argument("output_dir", help="Каталог для компактного формата (например, models/vectorizer_compact)")
+    args = parser.parse_args()
+
+    setup_logging()
+    export_vectorizer(joblib.load(args.source), args.output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,29 @@ if not APP_TOKEN:
     logging.critical("Токен бота не найден в .env!")
     raise ValueError("Токен бота не найден в .env!")
 
+# Режим получения апдейтов: "polling" или "webhook"
+BOT_RUN_MODE = os.getenv("BOT_RUN_MODE", "polling").lower()
+# Публичный адрес, который регистрируется в Telegram (например, https://bot.example.com);
+# пустое значение - вебхук не регистрируется (за балансировщиком это делает деплой)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+# Адрес, на котором слушает aiohttp-сервер вебхука
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+# Альтернативный Bot API сервер (локальный telegram-bot-api или тестовый стенд bot.webhook_loadtest)
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER", "")
+
+# Хранилище состояний FSM: sqlite (переживает перезапуск, общее для процессов на хосте) или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+FSM_STORAGE_PATH = os.getenv("FSM_STORAGE_PATH", os.path.join("state", "fsm_storage.sqlite3"))
+# Изменения состояний коммитятся пачкой раз в интервал (0 - сразу после каждого изменения)
+FSM_STORAGE_FLUSH_INTERVAL_MS = int(os.getenv("FSM_STORAGE_FLUSH_INTERVAL_MS", 50))
+# Брошенные сессии (например, выбранная модель без текста) забываются через TTL
+FSM_STATE_TTL_SECONDS = int(os.getenv("FSM_STATE_TTL_SECONDS", 24 * 60 * 60))
+FSM_STORAGE_CLEANUP_INTERVAL_SECONDS = float(os.getenv("FSM_STORAGE_CLEANUP_INTERVAL_SECONDS", 10 * 60))
+
 
 CH_HOST = os.getenv("CH_HOST", "clickhouse-server")
 CH_PORT = int(os.getenv("CH_PORT", 9000))
@@ -16,21 +39,120 @@ CH_USER = os.getenv("CH_USER", "bot_user")
 CH_PASSWORD = os.getenv("CH_PASSWORD", "")
 CH_DB = os.getenv("CH_DB", "fakenews_db")
 
+# Пул соединений с ClickHouse
+CH_POOL_SIZE = int(os.getenv("CH_POOL_SIZE", 4))
+CH_HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("CH_HEALTH_CHECK_INTERVAL_SECONDS", 30))
+CH_POOL_CHECKOUT_TIMEOUT_SECONDS = float(os.getenv("CH_POOL_CHECKOUT_TIMEOUT_SECONDS", 10))
+CH_RECONNECT_MAX_BACKOFF_SECONDS = float(os.getenv("CH_RECONNECT_MAX_BACKOFF_SECONDS", 30))
+
+# Фоновая пакетная запись логов в ClickHouse
+CH_WRITER_BATCH_SIZE = int(os.getenv("CH_WRITER_BATCH_SIZE", 1000))
+CH_WRITER_FLUSH_INTERVAL_SECONDS = float(os.getenv("CH_WRITER_FLUSH_INTERVAL_SECONDS", 1.0))
+CH_WRITER_MAX_QUEUE_SIZE = int(os.getenv("CH_WRITER_MAX_QUEUE_SIZE", 100000))
+CH_WRITER_MAX_RETRIES = int(os.getenv("CH_WRITER_MAX_RETRIES", 3))
+CH_WRITER_SPILL_PATH = os.getenv("CH_WRITER_SPILL_PATH", os.path.join("spill", "clickhouse_rows.jsonl"))
+CH_WRITER_SPILL_MAX_BYTES = int(os.getenv("CH_WRITER_SPILL_MAX_BYTES", 100 * 1024 * 1024))
+
 
 MODEL_DIR = "models"
-VECTORIZER_PATH = os.path.join(MODEL_DIR, "vectorizer_new.pkl")
+# Модели, которые загружаются не при старте, а при первом выборе пользователем (через запятую)
+LAZY_MODELS = {model_id.strip() for model_id in os.getenv("LAZY_MODELS", "lgbm").split(",") if model_id.strip()}
+# Потоков для параллельной загрузки артефактов при старте
+MODEL_LOAD_THREADS = int(os.getenv("MODEL_LOAD_THREADS", 4))
+# Pickle-файл TfidfVectorizer или каталог компактного формата (python -m bot.compact_vectorizer)
+VECTORIZER_PATH = os.getenv("VECTORIZER_PATH", os.path.join(MODEL_DIR, "vectorizer_new.pkl"))
+# Сигмоида Платта "a,b" для перевода отступа LinearSVC в уверенность. Для lsvc_model_new.pkl подбирается
+# по тестовой выборке ноутбука командой python -m bot.calibrate; пока не задана, используется
+# некалиброванная сигмоида по умолчанию (a=-1, b=0) и уверенность LinearSVC - не вероятность
+LINEAR_SVC_CALIBRATION = os.getenv("LINEAR_SVC_CALIBRATION", "")
 MODELS_CONFIG = {
     "linear_svc": {
         "path": os.path.join(MODEL_DIR, "lsvc_model_new.pkl"),
         "name": "LinearSVC (Быстрая)",
-        "description": "Линейный классификатор. Быстрый, хорошо подходит для текста."
+        "description": "Линейный классификатор. Быстрый, хорошо подходит для текста.",
+        "lazy": "linear_svc" in LAZY_MODELS
     },
     "lgbm": {
         "path": os.path.join(MODEL_DIR, "lgbm_model_new.pkl"),
         "name": "LightGBM (Точная)",
-        "description": "Градиентный бустинг. Высокая точность, может быть медленнее."
+        "description": "Градиентный бустинг. Высокая точность, может быть медленнее.",
+        "lazy": "lgbm" in LAZY_MODELS
     }
 }
+if LINEAR_SVC_CALIBRATION:
+    calibration_a, calibration_b = (float(value) for value in LINEAR_SVC_CALIBRATION.split(","))
+    MODELS_CONFIG["linear_svc"]["calibration"] = {"a": calibration_a, "b": calibration_b}
+
+# Профиль артефактов: full - исходные модели, lite - сжатые для контейнеров с малой памятью
+# (готовятся командой python -m bot.lite_models, лежат в LITE_MODEL_DIR)
+MODEL_PROFILE = os.getenv("MODEL_PROFILE", "full")
+LITE_MODEL_DIR = os.getenv("LITE_MODEL_DIR", os.path.join(MODEL_DIR, "lite"))
+if MODEL_PROFILE == "lite":
+    for model_id, config_data in MODELS_CONFIG.items():
+        config_data["path"] = os.path.join(LITE_MODEL_DIR, f"{model_id}.pkl")
+        config_data["vectorizer_path"] = os.path.join(LITE_MODEL_DIR, "vectorizer")
+        # Отдельная версия, чтобы запросы к сжатым моделям не смешивались в статистике с полными
+        config_data["version"] = "lite"
+elif MODEL_PROFILE != "full":
+    raise ValueError(f"Неизвестный MODEL_PROFILE: {MODEL_PROFILE} (допустимо: full, lite)")
+
+# Манифест версий моделей; при его изменении новые версии загружаются и подменяются без перезапуска
+MODEL_MANIFEST_PATH = os.getenv("MODEL_MANIFEST_PATH", os.path.join(MODEL_DIR, "manifest.json"))
+# Период проверки манифеста (0 - не отслеживать)
+MODEL_REGISTRY_POLL_SECONDS = float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", 30))
+# Сколько версий каждой модели держать в памяти (текущая и предыдущие для запросов "в полете")
+MODEL_REGISTRY_KEEP_VERSIONS = int(os.getenv("MODEL_REGISTRY_KEEP_VERSIONS", 2))
+
+# Вариант клавиатуры "сравнить все модели": один проход предобработки и векторизации на все модели
+ALL_MODELS_ID = "all"
+ALL_MODELS_NAME = "Все модели (сравнение)"
+ALL_MODELS_DESCRIPTION = "Вердикты всех моделей и общий вердикт по средней вероятности."
+
+# Размер LRU-кэша лемматизатора (в словах)
+LEMMA_CACHE_SIZE = int(os.getenv("LEMMA_CACHE_SIZE", 100000))
+
+# Количество процессов для инференса (0 - инференс в потоке основного процесса)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 2))
+INFERENCE_MP_START_METHOD = os.getenv("INFERENCE_MP_START_METHOD", "spawn")
+# Микробатчинг: запросы к одной модели, пришедшие в пределах окна, скорятся одним вызовом
+INFERENCE_BATCH_MAX_SIZE = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", 32))
+INFERENCE_BATCH_WINDOW_MS = int(os.getenv("INFERENCE_BATCH_WINDOW_MS", 10))
+
+# Длинные тексты скорятся по окнам: текст делится на окна по CHUNK_WINDOW_WORDS слов, из них берется
+# не больше CHUNK_MAX_WINDOWS равномерно по документу, так что время предсказания не растет с длиной текста.
+# Порог выше MAX_NEWS_TEXT_LENGTH: сообщения бота скорятся целиком, окна - для batch_score и других длинных входов.
+# Перед снижением порога сравните точность: python -m bot.benchmark --window-accuracy
+CHUNKED_INFERENCE_MIN_CHARS = int(os.getenv("CHUNKED_INFERENCE_MIN_CHARS", 10000))  # 0 - не делить на окна
+CHUNK_WINDOW_WORDS = int(os.getenv("CHUNK_WINDOW_WORDS", 400))
+CHUNK_MAX_WINDOWS = int(os.getenv("CHUNK_MAX_WINDOWS", 12))
+# Окон, обрабатываемых одним sparse-батчем между проверками раннего выхода
+CHUNK_GROUP_SIZE = int(os.getenv("CHUNK_GROUP_SIZE", 4))
+# Агрегация P(FAKE) по окнам: mean - среднее, max - фейк, если фейком выглядит хотя бы одно окно
+CHUNK_AGGREGATION = os.getenv("CHUNK_AGGREGATION", "mean")
+# Остановиться, когда агрегированная уверенность достигла порога (0 - обрабатывать все выбранные окна)
+CHUNK_EARLY_EXIT_CONFIDENCE = float(os.getenv("CHUNK_EARLY_EXIT_CONFIDENCE", 0.9))
+
+# Кэш результатов предсказаний (ключ - хеш нормализованного текста и версии модели)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10000))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", 6 * 60 * 60))
+# При промахе искать тот же текст среди недавних строк requests_log
+RESULT_CACHE_CLICKHOUSE_LOOKUP = os.getenv("RESULT_CACHE_CLICKHOUSE_LOOKUP", "false").lower() in ("1", "true", "yes")
+
+# HTTP-эндпоинт /metrics для Prometheus (0 - не запускать)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+
+# Ограничения на входе анализа: длина текста, частота запросов пользователя, запросы в обработке
+MAX_NEWS_TEXT_LENGTH = int(os.getenv("MAX_NEWS_TEXT_LENGTH", 4096))
+RATE_LIMIT_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", 6))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 3))
+RATE_LIMIT_MAX_TRACKED_USERS = int(os.getenv("RATE_LIMIT_MAX_TRACKED_USERS", 100000))
+# Общий предел запросов, одновременно находящихся в анализе (0 - без ограничения)
+MAX_IN_FLIGHT_ANALYSES = int(os.getenv("MAX_IN_FLIGHT_ANALYSES", 64))
+
+# /stats: пользователи, которым доступна статистика моделей (через запятую; пусто - всем), окно по умолчанию
+STATS_ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("STATS_ADMIN_USER_IDS", "").split(",") if user_id.strip()}
+STATS_DEFAULT_HOURS = int(os.getenv("STATS_DEFAULT_HOURS", 24))
 
 
 LOGGING_FORMAT = "%(levelname)s: %(asctime)s - %(module)s - %(message)s"
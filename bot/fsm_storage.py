@@ -0,0 +1,236 @@
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.storage import BaseStorage
+
+from .config import (FSM_STORAGE, FSM_STORAGE_PATH, FSM_STORAGE_FLUSH_INTERVAL_MS, FSM_STATE_TTL_SECONDS,
+                     FSM_STORAGE_CLEANUP_INTERVAL_SECONDS)
+
+
+def _empty_record() -> dict:
+    return {"state": None, "data": {}, "bucket": {}}
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in a local SQLite database (WAL) that survives restarts and is shared by processes on one host.
+
+    Changes are applied to a pending map at once and committed by a background thread in one transaction
+    per flush interval; reads see pending changes of this process first. Records untouched for longer than
+    the TTL (abandoned analysis sessions) are treated as empty and periodically deleted.
+    """
+    def __init__(self, path: str, flush_interval_ms: int, ttl_seconds: int, cleanup_interval_seconds: float):
+        self.path = path
+        self.flush_interval_seconds = flush_interval_ms / 1000
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval_seconds = cleanup_interval_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._read_connection = self._connect()
+        self._read_connection.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_state (
+                chat TEXT NOT NULL,
+                user TEXT NOT NULL,
+                state TEXT,
+                data TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (chat, user)
+            ) WITHOUT ROWID
+        """)
+        self._read_connection.execute("CREATE INDEX IF NOT EXISTS fsm_state_updated_at ON fsm_state (updated_at)")
+        self._read_connection.commit()
+
+        self._pending = {}
+        # Изменения, которые писатель сейчас коммитит: до конца транзакции читаются отсюда
+        self._flushing = {}
+        self._pending_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._writer_thread = threading.Thread(target=self._run_writer, name="fsm-storage-writer", daemon=True)
+        self._writer_thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL: читатели не блокируют писателя, в том числе из других процессов
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    async def close(self):
+        self._stop_event.set()
+        self._flush_event.set()
+        self._writer_thread.join(timeout=30)
+        self._read_connection.close()
+
+    async def wait_closed(self):
+        pass
+
+    def _read_record(self, chat: str, user: str) -> dict:
+        with self._pending_lock:
+            pending = self._pending.get((chat, user)) or self._flushing.get((chat, user))
+        if pending is not None:
+            return copy.deepcopy(pending[0])
+
+        row = self._read_connection.execute(
+            "SELECT state, data, bucket, updated_at FROM fsm_state WHERE chat = ? AND user = ?", (chat, user)
+        ).fetchone()
+        if row is None or row[3] < time.time() - self.ttl_seconds:
+            return _empty_record()
+        return {"state": row[0], "data": json.loads(row[1]), "bucket": json.loads(row[2])}
+
+    def _write_record(self, chat: str, user: str, record: dict):
+        with self._pending_lock:
+            self._pending[(chat, user)] = (record, time.time())
+        if self.flush_interval_seconds <= 0:
+            self._flush_event.set()
+
+    def _update(self, chat, user, update):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        record = self._read_record(chat, user)
+        update(record)
+        self._write_record(chat, user, record)
+
+    def _run_writer(self):
+        connection = self._connect()
+        last_cleanup = time.monotonic()
+        while True:
+            self._flush_event.wait(self.flush_interval_seconds or self.cleanup_interval_seconds)
+            self._flush_event.clear()
+            stopping = self._stop_event.is_set()
+            try:
+                self._flush(connection)
+                if time.monotonic() - last_cleanup >= self.cleanup_interval_seconds:
+                    self._delete_expired(connection)
+                    last_cleanup = time.monotonic()
+            except Exception as e:
+                logging.error(f"Ошибка записи состояний FSM в {self.path}: {e}", exc_info=True)
+            if stopping:
+                break
+        connection.close()
+
+    def _flush(self, connection: sqlite3.Connection):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+        if not pending:
+            return
+
+        upserts = []
+        deletes = []
+        for (chat, user), (record, updated_at) in pending.items():
+            if record == _empty_record():
+                deletes.append((chat, user, updated_at))
+            else:
+                upserts.append((chat, user, record["state"], json.dumps(record["data"], ensure_ascii=False),
+                                json.dumps(record["bucket"], ensure_ascii=False), updated_at))
+        try:
+            with connection:
+                # Отложенный сброс (повтор батча, другой процесс) не должен перезаписать более новое состояние
+                connection.executemany("DELETE FROM fsm_state WHERE chat = ? AND user = ? AND updated_at <= ?", deletes)
+                connection.executemany(
+                    "INSERT INTO fsm_state (chat, user, state, data, bucket, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (chat, user) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                    "bucket = excluded.bucket, updated_at = excluded.updated_at "
+                    "WHERE excluded.updated_at >= fsm_state.updated_at",
+                    upserts,
+                )
+        except Exception:
+            # Возвращаем несохраненные изменения, если их не перекрыли более новые
+            with self._pending_lock:
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+            raise
+        finally:
+            with self._pending_lock:
+                self._flushing = {}
+
+    def _delete_expired(self, connection: sqlite3.Connection):
+        with connection:
+            deleted = connection.execute("DELETE FROM fsm_state WHERE updated_at < ?",
+                                         (time.time() - self.ttl_seconds,)).rowcount
+        if deleted:
+            logging.info(f"Удалено просроченных состояний FSM: {deleted}")
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        state = self._read_record(chat, user)["state"]
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[str] = None) -> typing.Dict:
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        return self._read_record(chat, user)["data"]
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        self._update(chat, user, lambda record: record.update(state=self.resolve_state(state)))
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        self._update(chat, user, lambda record: record.update(data=copy.deepcopy(data or {})))
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        self._update(chat, user, lambda record: record["data"].update(data or {}, **kwargs))
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        def reset(record: dict):
+            record["state"] = None
+            if with_data:
+                record["data"] = {}
+        self._update(chat, user, reset)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        return self._read_record(chat, user)["bucket"]
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        self._update(chat, user, lambda record: record.update(bucket=copy.deepcopy(bucket or {})))
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        self._update(chat, user, lambda record: record["bucket"].update(bucket or {}, **kwargs))
+
+
+def create_fsm_storage() -> BaseStorage:
+    if FSM_STORAGE == "memory":
+        logging.info("Состояния FSM хранятся в памяти процесса (MemoryStorage).")
+        return MemoryStorage()
+    if FSM_STORAGE == "sqlite":
+        logging.info(f"Состояния FSM хранятся в SQLite: {FSM_STORAGE_PATH} (TTL {FSM_STATE_TTL_SECONDS} с).")
+        return SQLiteStorage(FSM_STORAGE_PATH, FSM_STORAGE_FLUSH_INTERVAL_MS, FSM_STATE_TTL_SECONDS,
+                             FSM_STORAGE_CLEANUP_INTERVAL_SECONDS)
+    raise ValueError(f"Неизвестный FSM_STORAGE: {FSM_STORAGE} (допустимо: memory, sqlite)")
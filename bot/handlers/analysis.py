@@ -1,5 +1,6 @@
 import logging
 import time
+import uuid
 from aiogram import types, Dispatcher
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Command
@@ -8,8 +9,12 @@ from aiogram.types import ParseMode
 
 from ..states import NewsAnalysis
 from ..keyboards import get_model_choice_keyboard, get_feedback_keyboard, feedback_cb
-from ..ml_utils import predict_fake_news, MODELS_CONFIG
-from ..clickhouse_utils import log_request_to_db, log_feedback_to_db
+from ..ml_utils import MODELS_CONFIG, schedule_model_warm_up, predict_all
+from ..config import ALL_MODELS_ID, ALL_MODELS_NAME, ALL_MODELS_DESCRIPTION
+from ..clickhouse_utils import log_request_to_db, log_request_group_to_db, log_feedback_to_db
+from ..result_cache import predict_with_cache
+from ..metrics import observe_request
+from ..middlewares import admission_controlled
 
 
 async def cmd_analyze_start(message: types.Message, state: FSMContext):
@@ -25,7 +30,7 @@ async def process_model_choice_handler(message: types.Message, state: FSMContext
     Handles the user's model choice.
     """
     chosen_model_name = message.text
-    selected_model_id = None
+    selected_model_id = ALL_MODELS_ID if chosen_model_name == ALL_MODELS_NAME else None
     for model_id, config_data in MODELS_CONFIG.items():
         if config_data["name"] == chosen_model_name:
             selected_model_id = model_id
@@ -37,13 +42,19 @@ async def process_model_choice_handler(message: types.Message, state: FSMContext
                                 reply_markup=get_model_choice_keyboard())
         return
 
+    # Модель с отложенной загрузкой начинает грузиться, пока пользователь пишет текст
+    for model_id in (MODELS_CONFIG if selected_model_id == ALL_MODELS_ID else [selected_model_id]):
+        schedule_model_warm_up(model_id)
+    description = (ALL_MODELS_DESCRIPTION if selected_model_id == ALL_MODELS_ID
+                   else MODELS_CONFIG[selected_model_id]['description'])
     await state.update_data(selected_model_id=selected_model_id)
     await NewsAnalysis.waiting_for_news_text.set()
     await message.reply(f"Выбрана: *{chosen_model_name}*.\n"
-                        f"{MODELS_CONFIG[selected_model_id]['description']}\n\n"
+                        f"{description}\n\n"
                         "Теперь отправьте мне текст новости для анализа.",
                         reply_markup=types.ReplyKeyboardRemove(), parse_mode=ParseMode.MARKDOWN)
 
+@admission_controlled
 async def process_news_text_handler(message: types.Message, state: FSMContext):
     """
     Processes the news text sent by the user.
@@ -58,31 +69,86 @@ async def process_news_text_handler(message: types.Message, state: FSMContext):
         await state.finish()
         return
 
-    start_time = time.time()
+    started_at = time.perf_counter()
     logging.info(f"User {message.from_user.id} (модель: {selected_model_id}) sent text: '{news_text[:100]}...'")
     status_message = await message.reply("🔎 Анализирую новость...")
+    telegram_ms = (time.perf_counter() - started_at) * 1000
 
-    label, probability = await predict_fake_news(news_text, selected_model_id)
-    processing_time_ms = int((time.time() - start_time) * 1000)
+    if selected_model_id == ALL_MODELS_ID:
+        await analyze_with_all_models(message, status_message, started_at, telegram_ms)
+        await state.finish()
+        return
 
-    request_id = await log_request_to_db(
-        user_id=message.from_user.id, chat_id=message.chat.id, message_id=message.message_id,
-        news_text=news_text, predicted_label=label, probability=probability,
-        processing_time_ms=processing_time_ms, selected_model_id=selected_model_id
-    )
+    stage_timings = {}
+    label, probability, is_cached, model_version = await predict_with_cache(news_text, selected_model_id, stage_timings)
 
     response_text = f"Результат ({MODELS_CONFIG[selected_model_id]['name']}): *{label}*"
     if probability is not None:
         response_text += f"\nУверенность: *{probability*100:.2f}%*"
-    
-    reply_markup = get_feedback_keyboard(request_id) if request_id else None
-    
+
+    request_id = str(uuid.uuid4())
+    reply_markup = get_feedback_keyboard(request_id)
+
+    edit_started_at = time.perf_counter()
     try:
         await status_message.edit_text(response_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
     except Exception:
         await message.reply(response_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+    stage_timings["telegram_ms"] = telegram_ms + (time.perf_counter() - edit_started_at) * 1000
+    processing_time_ms = int((time.perf_counter() - started_at) * 1000)
+
+    db_started_at = time.perf_counter()
+    await log_request_to_db(
+        user_id=message.from_user.id, chat_id=message.chat.id, message_id=message.message_id,
+        news_text=news_text, predicted_label=label, probability=probability,
+        processing_time_ms=processing_time_ms, selected_model_id=selected_model_id, is_cached=is_cached,
+        stage_timings=stage_timings, request_id=request_id, model_version=model_version
+    )
+    stage_timings["db_write_ms"] = (time.perf_counter() - db_started_at) * 1000
+    observe_request(selected_model_id, is_cached, stage_timings, processing_time_ms)
     await state.finish()
 
+async def analyze_with_all_models(message: types.Message, status_message: types.Message, started_at: float,
+                                  telegram_ms: float):
+    """
+    Scores the text with every model in one pass and replies with per-model verdicts and the combined one.
+    """
+    stage_timings = {}
+    prediction = await predict_all(message.text, timings=stage_timings)
+
+    response_lines = ["Результат сравнения моделей:"]
+    for model_id, result in prediction["models"].items():
+        line = f"• {MODELS_CONFIG[model_id]['name']}: *{result['label']}*"
+        if result["probability"] is not None:
+            line += f" ({result['probability']*100:.2f}%)"
+        response_lines.append(line)
+    combined = prediction["combined"]
+    response_lines.append(f"\nОбщий вердикт: *{combined['label']}*")
+    if combined["probability"] is not None:
+        response_lines.append(f"Уверенность: *{combined['probability']*100:.2f}%*")
+    response_text = "\n".join(response_lines)
+
+    # Фидбек относится к общему вердикту: его строка в requests_log имеет request_id = request_group_id
+    request_group_id = str(uuid.uuid4())
+    reply_markup = get_feedback_keyboard(request_group_id)
+
+    edit_started_at = time.perf_counter()
+    try:
+        await status_message.edit_text(response_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+    except Exception:
+        await message.reply(response_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+    stage_timings["telegram_ms"] = telegram_ms + (time.perf_counter() - edit_started_at) * 1000
+    processing_time_ms = int((time.perf_counter() - started_at) * 1000)
+
+    db_started_at = time.perf_counter()
+    await log_request_group_to_db(
+        user_id=message.from_user.id, chat_id=message.chat.id, message_id=message.message_id,
+        news_text=message.text, prediction=prediction, processing_time_ms=processing_time_ms,
+        stage_timings=stage_timings, request_group_id=request_group_id
+    )
+    stage_timings["db_write_ms"] = (time.perf_counter() - db_started_at) * 1000
+    observe_request(ALL_MODELS_ID, False, stage_timings, processing_time_ms)
+
 async def process_feedback_callback_handler(callback_query: types.CallbackQuery, callback_data: dict, state: FSMContext):
     request_id = callback_data.get("request_id")
     rating = callback_data.get("rating")
@@ -3,6 +3,10 @@ from aiogram import types, Dispatcher
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import CommandStart, CommandHelp, Command, Text
 
+from ..clickhouse_utils import fetch_model_stats
+from ..config import STATS_ADMIN_USER_IDS, STATS_DEFAULT_HOURS
+from ..stats import format_model_stats
+
 
 async def send_welcome_cmd(message: types.Message, state: FSMContext):
     """
@@ -34,10 +38,29 @@ async def cancel_cmd_handler(message: types.Message, state: FSMContext):
     await state.finish()
     await message.reply('Действие отменено.', reply_markup=types.ReplyKeyboardRemove())
 
+async def stats_cmd_handler(message: types.Message):
+    """
+    Handler for /stats [hours] command: per-model_version quality and latency aggregates
+    """
+    if STATS_ADMIN_USER_IDS and message.from_user.id not in STATS_ADMIN_USER_IDS:
+        await message.reply("Статистика доступна только администраторам.")
+        return
+
+    argument = message.get_args().strip()
+    hours = int(argument) if argument.isdigit() and int(argument) > 0 else STATS_DEFAULT_HOURS
+    try:
+        stats = await fetch_model_stats(hours)
+    except Exception as e:
+        logging.error(f"Ошибка чтения статистики моделей: {e}", exc_info=True)
+        await message.reply("Не удалось получить статистику. Попробуйте позже.")
+        return
+    await message.reply(format_model_stats(stats, hours))
+
 
 def register_common_handlers(dp: Dispatcher):
     dp.register_message_handler(send_welcome_cmd, CommandStart(), state="*")
     dp.register_message_handler(send_welcome_cmd, CommandHelp(), state="*")
     dp.register_message_handler(cancel_cmd_handler, Command(commands=['cancel']), state="*")
+    dp.register_message_handler(stats_cmd_handler, Command(commands=['stats']), state="*")
     dp.register_message_handler(cancel_cmd_handler, Text(equals='отмена', ignore_case=True), state="*")
     
\ No newline at end of file
@@ -0,0 +1,69 @@
+import csv
+import os
+import re
+import sys
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from . import ml_utils
+
+
+# Разбиение из fake-news.ipynb, на котором обучены models/*_new.pkl
+NOTEBOOK_RANDOM_STATE = 42
+NOTEBOOK_TEST_SIZE = 0.2
+NOTEBOOK_FILE_LABELS = {"Fake.csv": 1, "True.csv": 0}
+TWITTER_DISCLAIMER = ("The following statements were posted to the verified Twitter accounts of U.S. President "
+                      "Donald Trump, @realDonaldTrump and @POTUS. The opinions expressed are his own. Reuters has not "
+                      "edited the statements or confirmed their accuracy.")
+
+def remove_problematic_patterns(text: str) -> str:
+    # Как в ноутбуке: убираем префикс агентства и дисклеймер, по которым True.csv отличается от Fake.csv
+    text = re.sub(r"^[A-Za-z\s/]+\(Reuters\)\s*-\s*", "", text, count=1)
+    text = re.sub(r"^\(Reuters\)\s*-\s*", "", text, count=1)
+    text = re.sub(r"^" + re.escape(TWITTER_DISCLAIMER) + r"\s*", "", text, count=1)
+    return text.strip()
+
+def corpus_file_label(path: str) -> int:
+    file_name = os.path.basename(path)
+    if file_name not in NOTEBOOK_FILE_LABELS:
+        raise ValueError(f"Неизвестен класс корпуса {path} (ожидаются файлы {', '.join(NOTEBOOK_FILE_LABELS)})")
+    return NOTEBOOK_FILE_LABELS[file_name]
+
+def iter_notebook_corpus_texts(path: str, limit: int | None = None):
+    """
+    Yields texts of one corpus file cleaned as in fake-news.ipynb: duplicate rows dropped, title and text
+    joined, agency prefix and disclaimer removed. `limit` counts rows read, duplicates included.
+    """
+    csv.field_size_limit(sys.maxsize)
+    seen_rows = set()
+    with open(path, newline="", encoding="utf-8") as corpus_file:
+        for i, row in enumerate(csv.DictReader(corpus_file)):
+            if limit is not None and i >= limit:
+                return
+            # Файл корпуса - один класс, поэтому дубликаты строк ноутбука (с меткой) ищутся внутри файла
+            row_key = tuple(row.values())
+            if row_key in seen_rows:
+                continue
+            seen_rows.add(row_key)
+            yield remove_problematic_patterns(f"{row.get('title', '')} {row.get('text', '')}")
+
+def notebook_test_split(paths: list[str]) -> tuple[list[str], np.ndarray]:
+    """
+    Rebuilds the test split of fake-news.ipynb and returns its cleaned texts with labels (1 - fake).
+
+    Rows go through the notebook steps in its order: concat Fake then True, drop duplicate rows, join title
+    and text, clean, drop texts that are empty after preprocessing, then the stratified train_test_split.
+    """
+    rows = []
+    for path in paths:
+        label = corpus_file_label(path)
+        rows.extend((text, label) for text in iter_notebook_corpus_texts(path) if ml_utils.preprocess_text(text))
+    if not rows:
+        return [], np.array([], dtype=int)
+
+    labels = np.array([label for _, label in rows])
+    # Разбиение зависит только от числа строк и меток, поэтому индексы совпадают с разбиением Series в ноутбуке
+    _, test_indices = train_test_split(np.arange(len(rows)), test_size=NOTEBOOK_TEST_SIZE,
+                                       random_state=NOTEBOOK_RANDOM_STATE, stratify=labels)
+    return [rows[i][0] for i in test_indices], labels[test_indices]
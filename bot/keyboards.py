@@ -1,6 +1,6 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.callback_data import CallbackData
-from .config import MODELS_CONFIG
+from .config import MODELS_CONFIG, ALL_MODELS_NAME
 
 
 feedback_cb = CallbackData("feedback", "request_id", "rating")
@@ -17,5 +17,7 @@ def get_model_choice_keyboard() -> ReplyKeyboardMarkup:
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
     for model_id, config_data in MODELS_CONFIG.items():
         keyboard.add(KeyboardButton(config_data["name"]))
+    if len(MODELS_CONFIG) > 1:
+        keyboard.add(KeyboardButton(ALL_MODELS_NAME))
     keyboard.add(KeyboardButton("Отмена"))
     return keyboard
\ No newline at end of file
@@ -0,0 +1,195 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from .compact_vectorizer import CompactTfidfVectorizer, export_pruned_vectorizer, load_vectorizer
+from .config import MODELS_CONFIG, MODEL_PROFILE, LITE_MODEL_DIR, setup_logging
+from .quantized_models import ColumnMappedModel, QuantizedLinearModel
+
+
+LITE_VECTORIZER_DIR = "vectorizer"
+REPORT_FILE = "report.json"
+DEFAULT_KEEP_FEATURES = 50000
+
+
+def important_columns(model, keep_features: int) -> np.ndarray:
+    """
+    Columns a model relies on: top `keep_features` by |coef| for linear models, every split feature for LightGBM.
+    """
+    if hasattr(model, "coef_"):
+        coef = np.abs(np.asarray(model.coef_).ravel())
+        keep_features = min(keep_features, np.count_nonzero(coef))
+        return np.argpartition(coef, -keep_features)[-keep_features:] if keep_features else np.array([], dtype=int)
+    if hasattr(model, "booster_"):
+        split_counts = model.booster_.feature_importance(importance_type="split")
+        return np.flatnonzero(split_counts)
+    raise ValueError(f"Неподдерживаемый тип модели для сжатия: {type(model).__name__}")
+
+def vectorizer_n_features(vectorizer) -> int:
+    if isinstance(vectorizer, CompactTfidfVectorizer):
+        return vectorizer.meta["n_features"]
+    if not hasattr(vectorizer, "vocabulary_"):
+        # У HashingVectorizer нет словаря, который можно сократить
+        raise ValueError(f"Сжатие требует векторизатор со словарем, получен {type(vectorizer).__name__}")
+    return len(vectorizer.vocabulary_)
+
+def compress_model(model, kept_columns: np.ndarray, n_original_features: int, weights_dtype: str):
+    if hasattr(model, "coef_"):
+        coef = np.asarray(model.coef_)
+        if coef.shape[0] != 1:
+            raise ValueError("Поддерживаются только бинарные линейные модели")
+        return QuantizedLinearModel(coef[0, kept_columns], float(np.ravel(model.intercept_)[0]), model.classes_,
+                                    weights_dtype)
+    return ColumnMappedModel(model, kept_columns, n_original_features)
+
+def _artifacts_rss_mb(artifacts: list[tuple[str, str]]) -> float:
+    # Выполняется в отдельном свежем процессе: прирост RSS только от загрузки артефактов
+    from . import ml_utils
+    rss_before_mb = ml_utils.current_rss_mb()
+    loaded = [load_vectorizer(path) if kind == "vectorizer" else joblib.load(path) for kind, path in artifacts]
+    rss_mb = ml_utils.current_rss_mb() - rss_before_mb
+    del loaded
+    return rss_mb
+
+def measure_load_rss_mb(artifacts: list[tuple[str, str]]) -> float:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_artifacts_rss_mb, artifacts).result()
+
+def _disk_size_mb(path: str) -> float:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1024 / 1024
+    return os.path.getsize(path) / 1024 / 1024
+
+def evaluate_profiles(texts: list[str], labels: np.ndarray, profiles: dict) -> dict:
+    """
+    Scores held-out texts with each profile ({name: {model_id: (vectorizer, model, model_spec)}}).
+    """
+    from . import ml_utils
+    from .benchmark import latency_summary
+
+    preprocessed_texts = [ml_utils.preprocess_text(text) for text in texts]
+    report = {}
+    predictions_by_profile = {}
+    for profile_name, components in profiles.items():
+        for model_id, (vectorizer, model, model_spec) in components.items():
+            predictions = []
+            latencies = []
+            for text in preprocessed_texts:
+                started_at = time.perf_counter()
+                prediction, _ = ml_utils.score_text_vectors(model, model_spec, vectorizer.transform([text]))
+                latencies.append((time.perf_counter() - started_at) * 1000)
+                predictions.append(prediction[0])
+            predictions = np.asarray(predictions)
+            predictions_by_profile[(profile_name, model_id)] = predictions
+            report.setdefault(model_id, {})[profile_name] = {
+                "accuracy": float(np.mean(predictions == labels)),
+                "latency": latency_summary(latencies),
+            }
+
+    for model_id, model_report in report.items():
+        full_predictions = predictions_by_profile[("full", model_id)]
+        lite_predictions = predictions_by_profile[("lite", model_id)]
+        model_report["accuracy_delta"] = model_report["lite"]["accuracy"] - model_report["full"]["accuracy"]
+        model_report["agreement"] = float(np.mean(full_predictions == lite_predictions))
+    return report
+
+def build_lite_profile(args) -> dict:
+    from . import ml_utils
+    from .holdout import notebook_test_split
+    from .model_registry import default_model_specs
+
+    model_specs = {model_id: spec for model_id, spec in default_model_specs().items() if model_id in args.model}
+    vectorizer_paths = {model_spec["vectorizer_path"] for model_spec in model_specs.values()}
+    if len(vectorizer_paths) != 1:
+        raise ValueError(f"Модели профиля должны использовать один векторизатор, найдено: {sorted(vectorizer_paths)}")
+    vectorizer_path = vectorizer_paths.pop()
+    vectorizer = load_vectorizer(vectorizer_path)
+    models = {model_id: joblib.load(model_spec["path"]) for model_id, model_spec in model_specs.items()}
+
+    # Общий сокращенный словарь - объединение признаков, важных хотя бы для одной модели
+    kept_by_model = {model_id: important_columns(model, args.keep_features) for model_id, model in models.items()}
+    kept_columns = np.unique(np.concatenate(list(kept_by_model.values()))).astype(np.int32)
+    n_original_features = vectorizer_n_features(vectorizer)
+    logging.info(f"Сохраняется {len(kept_columns)} из {n_original_features} признаков: "
+                 f"{ {model_id: len(columns) for model_id, columns in kept_by_model.items()} }")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    lite_vectorizer_path = os.path.join(args.output_dir, LITE_VECTORIZER_DIR)
+    export_pruned_vectorizer(vectorizer, kept_columns, lite_vectorizer_path)
+    lite_paths = {}
+    for model_id, model in models.items():
+        lite_paths[model_id] = os.path.join(args.output_dir, f"{model_id}.pkl")
+        joblib.dump(compress_model(model, kept_columns, n_original_features, args.weights_dtype), lite_paths[model_id])
+
+    report = {
+        "parameters": {"keep_features": args.keep_features, "weights_dtype": args.weights_dtype,
+                       "holdout_limit": args.holdout_limit},
+        "features": {"full": n_original_features, "lite": len(kept_columns),
+                     "by_model": {model_id: len(columns) for model_id, columns in kept_by_model.items()}},
+        "disk_mb": {
+            "full": {"vectorizer": _disk_size_mb(vectorizer_path),
+                     **{model_id: _disk_size_mb(spec["path"]) for model_id, spec in model_specs.items()}},
+            "lite": {"vectorizer": _disk_size_mb(lite_vectorizer_path),
+                     **{model_id: _disk_size_mb(path) for model_id, path in lite_paths.items()}},
+        },
+        "load_rss_mb": {
+            "full": measure_load_rss_mb([("vectorizer", vectorizer_path)] +
+                                        [("model", spec["path"]) for spec in model_specs.values()]),
+            "lite": measure_load_rss_mb([("vectorizer", lite_vectorizer_path)] +
+                                        [("model", path) for path in lite_paths.values()]),
+        },
+    }
+
+    # Исходные модели обучены в fake-news.ipynb, поэтому оценка - на его тестовой выборке, а не на обучающих строках
+    ml_utils.load_nltk_components()
+    texts, labels = notebook_test_split(args.corpus)
+    if args.holdout_limit is not None:
+        # train_test_split уже перемешал строки, первые N - случайная подвыборка теста
+        texts, labels = texts[:args.holdout_limit], labels[:args.holdout_limit]
+    if texts:
+        lite_vectorizer = load_vectorizer(lite_vectorizer_path)
+        report["holdout"] = evaluate_profiles(texts, labels, {
+            "full": {model_id: (vectorizer, models[model_id], spec) for model_id, spec in model_specs.items()},
+            "lite": {model_id: (lite_vectorizer, joblib.load(lite_paths[model_id]), spec)
+                     for model_id, spec in model_specs.items()},
+        })
+        report["holdout_rows"] = len(texts)
+    else:
+        logging.warning("Тестовая выборка ноутбука пуста, точность не оценена.")
+
+    with open(os.path.join(args.output_dir, REPORT_FILE), "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+    logging.info(f"Профиль lite сохранен в {args.output_dir}: {json.dumps(report, ensure_ascii=False)}")
+    return report
+
+def main():
+    from .check_preprocessing import DEFAULT_CORPUS_FILES
+
+    parser = argparse.ArgumentParser(description="Сжатие моделей для профиля lite: отбор признаков, сокращенный "
+                                                 "словарь и квантованные веса, с отчетом о точности, памяти и задержке.")
+    parser.add_argument("--model", action="append", choices=list(MODELS_CONFIG), default=None)
+    parser.add_argument("--keep-features", type=int, default=DEFAULT_KEEP_FEATURES,
+                        help="Признаков с наибольшим |coef| у линейных моделей (у LightGBM - все признаки из сплитов)")
+    parser.add_argument("--weights-dtype", choices=["int8", "float16"], default="int8")
+    parser.add_argument("--output-dir", default=LITE_MODEL_DIR)
+    parser.add_argument("--corpus", nargs="+", default=DEFAULT_CORPUS_FILES,
+                        help="Fake.csv и True.csv, на которых обучены модели в fake-news.ipynb")
+    parser.add_argument("--holdout-limit", type=int, default=2000,
+                        help="Текстов тестовой выборки ноутбука для оценки точности и задержки")
+    args = parser.parse_args()
+    args.model = args.model or list(MODELS_CONFIG)
+
+    setup_logging()
+    if MODEL_PROFILE != "full":
+        raise SystemExit("Сжатие выполняется из исходных моделей: запустите с MODEL_PROFILE=full")
+    build_lite_profile(args)
+
+if __name__ == "__main__":
+    main()
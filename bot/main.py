@@ -1,10 +1,16 @@
 import logging
 from aiogram import Bot, Dispatcher, executor, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.bot.api import TelegramAPIServer
 
-from .config import APP_TOKEN, setup_logging
-from .clickhouse_utils import get_clickhouse_client
-from .ml_utils import load_ml_components
+from .config import (APP_TOKEN, BOT_RUN_MODE, WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_MAX_CONNECTIONS,
+                     WEBAPP_HOST, WEBAPP_PORT, TELEGRAM_API_SERVER, MAX_NEWS_TEXT_LENGTH, RATE_LIMIT_REQUESTS_PER_MINUTE,
+                     RATE_LIMIT_BURST, RATE_LIMIT_MAX_TRACKED_USERS, MAX_IN_FLIGHT_ANALYSES, setup_logging)
+from .clickhouse_utils import check_clickhouse_connection, clickhouse_pool, clickhouse_writer
+from .ml_utils import start_inference_executor, shutdown_inference_executor, prepare_model_version
+from .model_registry import model_registry
+from .metrics import start_metrics_server
+from .fsm_storage import create_fsm_storage
+from .middlewares import AdmissionMiddleware, TokenBucketLimiter
 from .handlers import register_all_handlers
 
 
@@ -12,21 +18,37 @@ setup_logging()
 
 async def on_startup(dp: Dispatcher):
     logging.info("Инициализация ClickHouse клиента...")
-    if get_clickhouse_client() is None:
+    if not check_clickhouse_connection():
         logging.critical("Не удалось подключиться к ClickHouse. Бот не может стартовать.")
-    
+    clickhouse_writer.start()
+
     logging.info("Загрузка ML моделей и NLTK ресурсов...")
     try:
-        load_ml_components()
+        await start_inference_executor()
     except Exception as e:
         logging.critical(f"Критическая ошибка при загрузке ML компонентов: {e}. Бот не может стартовать.")
         return
 
+    model_registry.start_watching(prepare_model_version)
+    start_metrics_server()
+
     logging.info("Установка команд бота...")
     await set_bot_commands(dp)
+
+    if BOT_RUN_MODE == "webhook" and WEBHOOK_HOST:
+        logging.info(f"Регистрация вебхука {WEBHOOK_URL}...")
+        await dp.bot.set_webhook(WEBHOOK_URL, max_connections=WEBHOOK_MAX_CONNECTIONS)
     logging.info("Бот готов к работе!")
 
 
+async def on_shutdown(dp: Dispatcher):
+    model_registry.stop_watching()
+    shutdown_inference_executor()
+    # Дописываем в ClickHouse все, что осталось в очереди
+    clickhouse_writer.stop()
+    clickhouse_pool.close()
+
+
 async def set_bot_commands(dp: Dispatcher):
     await dp.bot.set_my_commands([
         types.BotCommand("start", "🚀 Запустить бота / Помощь"),
@@ -37,15 +59,28 @@ async def set_bot_commands(dp: Dispatcher):
 def main():
     logging.info("Запуск бота Fake News Detector...")
 
-    storage = MemoryStorage()
-    bot_instance = Bot(token=APP_TOKEN)
+    storage = create_fsm_storage()
+    bot_kwargs = {}
+    if TELEGRAM_API_SERVER:
+        bot_kwargs["server"] = TelegramAPIServer.from_base(TELEGRAM_API_SERVER)
+    bot_instance = Bot(token=APP_TOKEN, **bot_kwargs)
     dp = Dispatcher(bot_instance, storage=storage)
+    dp.middleware.setup(AdmissionMiddleware(
+        max_text_length=MAX_NEWS_TEXT_LENGTH,
+        limiter=TokenBucketLimiter(RATE_LIMIT_REQUESTS_PER_MINUTE, RATE_LIMIT_BURST, RATE_LIMIT_MAX_TRACKED_USERS),
+        max_in_flight=MAX_IN_FLIGHT_ANALYSES,
+    ))
 
 
     register_all_handlers(dp)
     
-    
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
+    if BOT_RUN_MODE == "webhook":
+        # Вебхук не удаляется при остановке: за балансировщиком могут работать другие реплики
+        logging.info(f"Режим вебхука: {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+        executor.start_webhook(dispatcher=dp, webhook_path=WEBHOOK_PATH, on_startup=on_startup,
+                               on_shutdown=on_shutdown, host=WEBAPP_HOST, port=WEBAPP_PORT)
+    else:
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
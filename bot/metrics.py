@@ -0,0 +1,66 @@
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from .config import METRICS_HOST, METRICS_PORT
+
+
+# Границы бакетов в секундах: от долей миллисекунды (кэш, предобработка) до десятков секунд (Telegram API)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+REQUEST_STAGE_LATENCY = Histogram(
+    "fakenews_request_stage_seconds",
+    "Latency of a single stage of news analysis",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_TOTAL = Counter(
+    "fakenews_requests_total",
+    "Analyzed news texts",
+    ["model", "cached"],
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "fakenews_inference_batch_size",
+    "Number of texts scored in one inference batch",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+DB_FLUSH_LATENCY = Histogram(
+    "fakenews_db_flush_seconds",
+    "Latency of one batched insert into ClickHouse",
+    ["table"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "fakenews_admission_rejections_total",
+    "Analysis requests rejected before inference",
+    ["reason"],
+)
+ANALYSIS_IN_FLIGHT = Gauge("fakenews_analysis_in_flight", "Analysis requests admitted and not yet finished")
+RESULT_CACHE_ENTRIES = Gauge("fakenews_result_cache_entries", "Entries in the in-process result cache")
+RESULT_CACHE_HITS = Gauge("fakenews_result_cache_hits", "Result cache hits since start")
+RESULT_CACHE_MISSES = Gauge("fakenews_result_cache_misses", "Result cache misses since start")
+DB_QUEUE_SIZE = Gauge("fakenews_db_queue_size", "Rows waiting in the background ClickHouse writer")
+DB_DROPPED_ROWS = Gauge("fakenews_db_dropped_rows", "Rows dropped by the background ClickHouse writer")
+
+def observe_stage_ms(stage: str, duration_ms: float | None):
+    if duration_ms is not None:
+        REQUEST_STAGE_LATENCY.labels(stage).observe(duration_ms / 1000)
+
+def observe_request(model_id: str, is_cached: bool, stage_timings: dict, total_ms: float):
+    REQUESTS_TOTAL.labels(model_id, str(is_cached).lower()).inc()
+    for stage in ("queue_wait", "preprocess", "vectorize", "predict", "telegram", "db_write"):
+        observe_stage_ms(stage, stage_timings.get(f"{stage}_ms"))
+    observe_stage_ms("total", total_ms)
+
+def start_metrics_server() -> bool:
+    if METRICS_PORT <= 0:
+        logging.info("Эндпоинт метрик отключен (METRICS_PORT=0).")
+        return False
+    try:
+        start_http_server(METRICS_PORT, addr=METRICS_HOST)
+    except OSError as e:
+        logging.error(f"Не удалось запустить эндпоинт метрик на {METRICS_HOST}:{METRICS_PORT}: {e}")
+        return False
+    logging.info(f"Метрики Prometheus доступны на http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return True
@@ -0,0 +1,96 @@
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from .metrics import ANALYSIS_IN_FLIGHT, ADMISSION_REJECTIONS
+
+
+def admission_controlled(handler):
+    """
+    Marks a message handler whose calls pass through AdmissionMiddleware limits.
+    """
+    setattr(handler, "admission_controlled", True)
+    return handler
+
+
+class TokenBucketLimiter:
+    """
+    Per-user token buckets; the least recently seen users are forgotten beyond `max_tracked_users`.
+    """
+    def __init__(self, requests_per_minute: float, burst: int, max_tracked_users: int):
+        self.rate_per_second = requests_per_minute / 60
+        self.burst = max(1, burst)
+        self.max_tracked_users = max_tracked_users
+        self._buckets = OrderedDict()
+
+    def acquire(self, user_id: int) -> float:
+        """
+        Takes a token and returns 0, or returns the number of seconds until the next token.
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate_per_second)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate_per_second
+        self._buckets[user_id] = (tokens, now)
+        # Забытый пользователь получит полный бакет - это безопаснее, чем неограниченный рост словаря
+        while len(self._buckets) > self.max_tracked_users:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class AdmissionMiddleware(BaseMiddleware):
+    """
+    Rejects analysis requests that are too long, too frequent for the user, or exceed the global in-flight limit.
+    """
+    def __init__(self, max_text_length: int, limiter: TokenBucketLimiter, max_in_flight: int):
+        super().__init__()
+        self.max_text_length = max_text_length
+        self.limiter = limiter
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        ANALYSIS_IN_FLIGHT.set_function(lambda: self.in_flight)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        handler = current_handler.get()
+        if not getattr(handler, "admission_controlled", False):
+            return
+
+        user_id = message.from_user.id
+        text_length = len(message.text or "")
+        if self.max_text_length > 0 and text_length > self.max_text_length:
+            await self._reject(message, "text_too_long",
+                               f"Текст слишком длинный ({text_length} символов). Пожалуйста, отправьте "
+                               f"не больше {self.max_text_length} символов.")
+
+        # Отказ по перегрузке не расходует токен пользователя
+        if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+            await self._reject(message, "overloaded",
+                               "Сейчас бот перегружен запросами. Пожалуйста, отправьте текст еще раз через минуту.")
+
+        retry_after = self.limiter.acquire(user_id)
+        if retry_after > 0:
+            await self._reject(message, "rate_limited",
+                               f"Слишком много запросов. Пожалуйста, попробуйте снова через {int(retry_after) + 1} с.")
+
+        self.in_flight += 1
+        data["admitted"] = True
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        if data.pop("admitted", False):
+            self.in_flight -= 1
+
+    @staticmethod
+    async def _reject(message: types.Message, reason: str, reply_text: str):
+        ADMISSION_REJECTIONS.labels(reason).inc()
+        logging.warning(f"Запрос user {message.from_user.id} отклонен ({reason}).")
+        # Состояние FSM не сбрасывается: пользователь может просто повторить отправку
+        await message.reply(reply_text)
+        raise CancelHandler()
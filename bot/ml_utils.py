@@ -1,44 +1,167 @@
 import os
+import asyncio
 import logging
+import multiprocessing
+import re
+import resource
 import joblib
 import string
+import time
+from functools import lru_cache
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
-from .config import VECTORIZER_PATH, MODELS_CONFIG
+from .compact_vectorizer import load_vectorizer
+from .metrics import INFERENCE_BATCH_SIZE
+from .model_registry import model_registry, loaded_models, format_model_version
+from .config import (MODELS_CONFIG, INFERENCE_WORKERS, INFERENCE_MP_START_METHOD,
+                     INFERENCE_BATCH_MAX_SIZE, INFERENCE_BATCH_WINDOW_MS, LEMMA_CACHE_SIZE, MODEL_LOAD_THREADS,
+                     CHUNKED_INFERENCE_MIN_CHARS, CHUNK_WINDOW_WORDS, CHUNK_MAX_WINDOWS, CHUNK_GROUP_SIZE,
+                     CHUNK_AGGREGATION, CHUNK_EARLY_EXIT_CONFIDENCE, setup_logging)
 
-vectorizer_instance = None
-models_loaded_instances = {}
 lemmatizer_instance = None
 stop_words_set = None
+lemmatize_cached = None
+inference_executor = None
+# Потоки для одновременного скоринга одного вектора несколькими моделями (создается в воркере при первом вызове)
+_scoring_pool = None
+# Фоновые прогревы моделей с отложенной загрузкой, не больше одного на модель
+_model_warm_up_tasks = {}
+# Фоновый перезапуск пула инференса после падения воркера
+_executor_restart_task = None
 
-def load_ml_components():
-    global vectorizer_instance, models_loaded_instances, lemmatizer_instance, stop_words_set
+# Удаление ASCII-пунктуации и отделение типографских кавычек за один проход translate.
+# После удаления ASCII-пунктуации из правил word_tokenize (Punkt + NLTKWordTokenizer) на текст
+# влияют только эти кавычки и разбиение слитных форм вроде "cannot"/"gonna"
+_PREPROCESS_TABLE = str.maketrans({
+    **{char: None for char in string.punctuation},
+    **{char: f" {char} " for char in "«“‘„»”’"},
+})
+_CONTRACTIONS_RE = re.compile(
+    r"\b(can)(not)\b|\b(gim)(me)\b|\b(gon)(na)\b|\b(got)(ta)\b|\b(lem)(me)\b|\b(wan)(na)(?=\s)"
+)
+
+FAKE_LABEL = "FAKE 🤥"
+REAL_LABEL = "REAL ✅"
+UNPROCESSABLE_LABEL = "Не удалось обработать текст"
+
+# Текст для прогревочного предсказания после отложенной загрузки модели
+WARM_UP_TEXT = "The government announced new measures to support the economy on Monday."
+
+# Стадии, выполняемые внутри воркера инференса
+COMPUTE_STAGES = ("preprocess_ms", "vectorize_ms", "predict_ms")
+
+# Некалиброванная сигмоида отступа для моделей без predict_proba, пока калибровка не подобрана (python -m bot.calibrate)
+DEFAULT_DECISION_CALIBRATION = {"a": -1.0, "b": 0.0}
+
+def current_rss_mb() -> float:
+    # Текущий (а не пиковый) RSS процесса; без /proc - пиковый из getrusage
     try:
-        if not os.path.exists(VECTORIZER_PATH):
-            raise FileNotFoundError(f"Векторизатор не найден: {VECTORIZER_PATH}")
-        vectorizer_instance = joblib.load(VECTORIZER_PATH)
-        logging.info("Векторизатор успешно загружен.")
+        with open("/proc/self/statm") as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _load_artifact(artifact_name: str, path: str, loader):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Артефакт '{artifact_name}' не найден: {path}")
+    rss_before_mb = current_rss_mb()
+    started_at = time.perf_counter()
+    artifact = loader(path)
+    load_seconds = time.perf_counter() - started_at
+    # При параллельной загрузке прирост RSS включает артефакты, загружавшиеся одновременно
+    logging.info(f"Артефакт '{artifact_name}' загружен за {load_seconds:.2f} с "
+                 f"(прирост RSS: {current_rss_mb() - rss_before_mb:+.1f} МБ).")
+    return artifact
 
-        for model_id, config_data in MODELS_CONFIG.items():
-            if not os.path.exists(config_data["path"]):
-                raise FileNotFoundError(f"Файл модели '{model_id}' не найден: {config_data['path']}")
-            models_loaded_instances[model_id] = joblib.load(config_data["path"])
-            logging.info(f"Модель '{config_data['name']}' ({model_id}) успешно загружена.")
+def get_model_components(model_spec: dict) -> tuple:
+    """
+    Returns (vectorizer, model) of the exact model version, loading them on first use; thread-safe.
+    """
+    model_version = format_model_version(model_spec)
+    return loaded_models.get(
+        model_spec,
+        load_vectorizer=lambda path: _load_artifact(f"vectorizer {path}", path, load_vectorizer),
+        load_model=lambda path: _load_artifact(model_version, path, joblib.load),
+    )
 
+def load_ml_components(include_lazy: bool = False):
+    model_specs = [model_registry.get_spec(model_id) for model_id, config_data in MODELS_CONFIG.items()
+                   if include_lazy or not config_data.get("lazy")]
+    rss_before_mb = current_rss_mb()
+    started_at = time.perf_counter()
+    try:
+        # Распаковка pickle и чтение корпусов NLTK в основном I/O и numpy, поэтому потоки дают выигрыш
+        with ThreadPoolExecutor(max_workers=max(1, MODEL_LOAD_THREADS), thread_name_prefix="model-load") as pool:
+            nltk_future = pool.submit(load_nltk_components)
+            model_futures = [pool.submit(get_model_components, model_spec) for model_spec in model_specs]
+            for model_future in model_futures:
+                model_future.result()
+            nltk_future.result()
     except Exception as e:
         logging.error(f"Ошибка загрузки ML моделей: {e}", exc_info=True)
         raise
 
+    logging.info(f"ML компоненты загружены за {time.perf_counter() - started_at:.2f} с, RSS: "
+                 f"{rss_before_mb:.0f} -> {current_rss_mb():.0f} МБ. Загружены версии: {loaded_models.loaded_versions()}.")
+
+def load_nltk_components():
+    global lemmatizer_instance, stop_words_set, lemmatize_cached
     try:
+        started_at = time.perf_counter()
         lemmatizer_instance = WordNetLemmatizer()
-        stop_words_set = set(stopwords.words('english'))
-        logging.info("NLTK ресурсы успешно инициализированы.")
+        # WordNet подгружается при первом вызове lemmatize - делаем это здесь, а не на первом запросе
+        lemmatizer_instance.lemmatize("news")
+        lemmatize_cached = lru_cache(maxsize=LEMMA_CACHE_SIZE)(lemmatizer_instance.lemmatize)
+        stop_words_set = frozenset(stopwords.words('english'))
+        logging.info(f"NLTK ресурсы успешно инициализированы за {time.perf_counter() - started_at:.2f} с.")
     except LookupError as e:
         logging.error(f"Ошибка инициализации NLTK ресурсов: {e}. Убедитесь, что пакеты скачаны (в Dockerfile).")
         raise
 
+def combine_predictions(results: list[tuple[str, float | None]]) -> tuple[str, float | None]:
+    """
+    Averages P(FAKE) over models that returned a probability; the verdict is the more likely class.
+    """
+    fake_probabilities = [probability if label == FAKE_LABEL else 1.0 - probability
+                          for label, probability in results if probability is not None]
+    if not fake_probabilities:
+        return (results[0][0] if results else UNPROCESSABLE_LABEL), None
+    return fake_probability_to_result(float(np.mean(fake_probabilities)))
+
+def fake_probability_to_result(fake_probability: float) -> tuple[str, float]:
+    if fake_probability >= 0.5:
+        return FAKE_LABEL, fake_probability
+    return REAL_LABEL, 1.0 - fake_probability
+
+def get_model_version(model_id: str) -> str:
+    return model_registry.model_version(model_id)
+
+def prediction_to_label(prediction) -> str:
+    return FAKE_LABEL if prediction == 1 else REAL_LABEL
+
+def _split_contraction(match: re.Match) -> str:
+    return " " + " ".join(part for part in match.groups() if part) + " "
+
 def preprocess_text(text: str) -> str:
+    if lemmatize_cached is None or stop_words_set is None:
+        logging.error("NLTK компоненты (lemmatizer/stopwords) не инициализированы!")
+        return ""
+    if not isinstance(text, str):
+        logging.warning(f"preprocess_text получил не строку: {type(text)}. Возвращаю пустую строку.")
+        return ""
+    text = text.lower().translate(_PREPROCESS_TABLE)
+    text = _CONTRACTIONS_RE.sub(_split_contraction, f" {text} ")
+    return " ".join(
+        lemmatize_cached(word) for word in text.split()
+        if word not in stop_words_set and word.isalpha()
+    )
+
+def preprocess_text_reference(text: str) -> str:
+    # Исходная реализация на word_tokenize, используется для проверки эквивалентности preprocess_text
     if lemmatizer_instance is None or stop_words_set is None:
         logging.error("NLTK компоненты (lemmatizer/stopwords) не инициализированы!")
         return ""
@@ -54,34 +177,458 @@ def preprocess_text(text: str) -> str:
             processed_tokens.append(lemmatizer_instance.lemmatize(word))
     return " ".join(processed_tokens)
 
-async def predict_fake_news(news_text: str, model_id: str) -> tuple[str, float | None]:
-    if vectorizer_instance is None or not models_loaded_instances:
-        logging.error("ML компоненты (vectorizer/models) не загружены!")
-        return "Ошибка: ML компоненты не готовы", None
+def score_text_vectors(model, model_config: dict, text_vectors) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Scores vectors with a single model pass and returns predicted classes with their confidence.
+    """
+    if hasattr(model, "predict_proba"):
+        # Метка берется из тех же вероятностей, деревья LightGBM проходятся один раз
+        class_probabilities = model.predict_proba(text_vectors)
+        best_classes = class_probabilities.argmax(axis=1)
+        confidences = class_probabilities[np.arange(len(best_classes)), best_classes]
+        return model.classes_[best_classes], confidences
+
+    # LinearSVC не дает вероятностей: калибруем отступ decision_function сигмоидой Платта
+    # P(класс 1 | f) = 1 / (1 + exp(A * f + B))
+    scores = model.decision_function(text_vectors)
+    calibration = model_config.get("calibration", DEFAULT_DECISION_CALIBRATION)
+    positive_probabilities = 1.0 / (1.0 + np.exp(calibration["a"] * scores + calibration["b"]))
+    is_positive = scores > 0
+    predictions = model.classes_[is_positive.astype(int)]
+    confidences = np.where(is_positive, positive_probabilities, 1.0 - positive_probabilities)
+    return predictions, confidences
+
+def is_long_text(news_text: str) -> bool:
+    return CHUNKED_INFERENCE_MIN_CHARS > 0 and len(news_text) >= CHUNKED_INFERENCE_MIN_CHARS
+
+def split_into_windows(news_text: str) -> list[str]:
+    """
+    Splits the text into windows of CHUNK_WINDOW_WORDS words, keeping at most CHUNK_MAX_WINDOWS spread over it.
+    """
+    words = news_text.split()
+    window_starts = range(0, len(words), max(1, CHUNK_WINDOW_WORDS))
+    if len(window_starts) > CHUNK_MAX_WINDOWS:
+        # Начало, конец и равномерно между ними: пересланная лента оценивается целиком, а не только по началу
+        selected = np.linspace(0, len(window_starts) - 1, max(1, CHUNK_MAX_WINDOWS)).round().astype(int)
+        window_starts = [window_starts[i] for i in selected]
+    return [" ".join(words[start:start + CHUNK_WINDOW_WORDS]) for start in window_starts]
 
-    if model_id not in models_loaded_instances:
-        logging.error(f"Запрошена неизвестная модель: {model_id}")
-        return "Ошибка: модель не найдена", None
-    
-    selected_model = models_loaded_instances[model_id]
-    model_friendly_name = MODELS_CONFIG[model_id]["name"]
+def aggregate_window_probabilities(fake_probabilities: list[float]) -> float:
+    if CHUNK_AGGREGATION == "mean":
+        return float(np.mean(fake_probabilities))
+    if CHUNK_AGGREGATION == "max":
+        return float(np.max(fake_probabilities))
+    raise ValueError(f"Неизвестный CHUNK_AGGREGATION: {CHUNK_AGGREGATION} (допустимо: mean, max)")
 
+def _is_confident_enough(fake_probability: float | None) -> bool:
+    if fake_probability is None or CHUNK_EARLY_EXIT_CONFIDENCE <= 0:
+        return False
+    if CHUNK_AGGREGATION == "max":
+        # Максимум по следующим окнам может только вырасти, поэтому досрочно известен лишь вердикт FAKE
+        return fake_probability >= CHUNK_EARLY_EXIT_CONFIDENCE
+    return max(fake_probability, 1.0 - fake_probability) >= CHUNK_EARLY_EXIT_CONFIDENCE
+
+def score_chunked_text(news_text: str, model_specs: list[dict],
+                       components: list[tuple]) -> tuple[list[tuple[str, float | None]], dict]:
+    """
+    Scores a long text window by window with each model and aggregates P(FAKE) over the scored windows.
+
+    Windows go in groups of CHUNK_GROUP_SIZE, each vectorized as one sparse batch per vectorizer;
+    scoring stops early once the aggregate of every model is confident enough.
+    """
+    windows = split_into_windows(news_text)
+    stage_timings = {"preprocess_ms": 0.0, "vectorize_ms": 0.0, "predict_ms": 0.0, "batch_size": 1, "chunks": 0}
+    fake_probabilities = [[] for _ in model_specs]
+    aggregated = [None] * len(model_specs)
+    group_size = max(1, CHUNK_GROUP_SIZE)
+    for group_start in range(0, len(windows), group_size):
+        stage_started_at = time.perf_counter()
+        preprocessed_windows = [text for text in map(preprocess_text, windows[group_start:group_start + group_size])
+                                if text.strip()]
+        stage_timings["preprocess_ms"] += (time.perf_counter() - stage_started_at) * 1000
+        if not preprocessed_windows:
+            continue
+        stage_timings["chunks"] += len(preprocessed_windows)
+
+        stage_started_at = time.perf_counter()
+        vectors_by_path = {}
+        for model_spec, (vectorizer, _) in zip(model_specs, components):
+            if model_spec["vectorizer_path"] not in vectors_by_path:
+                vectors_by_path[model_spec["vectorizer_path"]] = vectorizer.transform(preprocessed_windows)
+        stage_timings["vectorize_ms"] += (time.perf_counter() - stage_started_at) * 1000
+
+        stage_started_at = time.perf_counter()
+        for i, (model_spec, (_, model)) in enumerate(zip(model_specs, components)):
+            predictions, confidences = score_text_vectors(model, model_spec, vectors_by_path[model_spec["vectorizer_path"]])
+            fake_probabilities[i].extend(np.where(predictions == 1, confidences, 1.0 - confidences))
+            aggregated[i] = aggregate_window_probabilities(fake_probabilities[i])
+        stage_timings["predict_ms"] += (time.perf_counter() - stage_started_at) * 1000
+        if all(_is_confident_enough(fake_probability) for fake_probability in aggregated):
+            break
+
+    results = [fake_probability_to_result(fake_probability) if fake_probability is not None
+               else (UNPROCESSABLE_LABEL, None) for fake_probability in aggregated]
+    logging.info(f"Длинный текст ({len(news_text)} символов): оценено окон {stage_timings['chunks']} из "
+                 f"{len(windows)} ({CHUNK_AGGREGATION}), модели {[format_model_version(spec) for spec in model_specs]}, "
+                 f"результаты: {results}")
+    return results, stage_timings
+
+def _init_inference_worker():
+    # Выполняется один раз в каждом процессе пула: модели грузятся при старте воркера
+    setup_logging()
+    load_ml_components()
+
+def _inference_worker_ready() -> int:
+    return os.getpid()
+
+async def start_inference_executor():
+    global inference_executor
+    if INFERENCE_WORKERS <= 0:
+        logging.info("Пул процессов для инференса отключен, модели загружаются в основном процессе.")
+        load_ml_components()
+        return
+
+    logging.info(f"Запуск пула инференса: {INFERENCE_WORKERS} процесс(ов), метод '{INFERENCE_MP_START_METHOD}'...")
+    inference_executor = ProcessPoolExecutor(
+        max_workers=INFERENCE_WORKERS,
+        mp_context=multiprocessing.get_context(INFERENCE_MP_START_METHOD),
+        initializer=_init_inference_worker,
+    )
+    loop = asyncio.get_running_loop()
     try:
-        preprocessed_text = preprocess_text(news_text)
-        if not preprocessed_text.strip():
-            return "Не удалось обработать текст", None
-
-        text_vector = vectorizer_instance.transform([preprocessed_text])
-        prediction = selected_model.predict(text_vector)[0]
-        
-        probability = None
-        if hasattr(selected_model, "predict_proba"):
-            proba = selected_model.predict_proba(text_vector)[0]
-            probability = float(max(proba))
-
-        label = "FAKE 🤥" if prediction == 1 else "REAL ✅"
-        logging.info(f"Предсказание с помощью '{model_friendly_name}': {label}, {probability}")
-        return label, probability
+        # Прогреваем все воркеры, чтобы ошибки загрузки моделей всплыли до приема апдейтов
+        worker_pids = await asyncio.gather(*(
+            loop.run_in_executor(inference_executor, _inference_worker_ready)
+            for _ in range(INFERENCE_WORKERS)
+        ))
+    except Exception:
+        shutdown_inference_executor()
+        raise
+    logging.info(f"Пул инференса готов, процессы: {sorted(set(worker_pids))}")
+
+def _warm_up_model_sync(model_spec: dict) -> int:
+    get_model_components(model_spec)
+    _predict_batch_sync([WARM_UP_TEXT], model_spec)
+    return os.getpid()
+
+async def _warm_up_model(model_spec: dict):
+    loop = asyncio.get_running_loop()
+    model_version = format_model_version(model_spec)
+    started_at = time.perf_counter()
+    try:
+        # Пул не позволяет адресовать конкретный процесс: отправляем по задаче на воркер,
+        # и пока первые грузят модель, остальные задачи достаются свободным процессам
+        worker_pids = await asyncio.gather(*(
+            loop.run_in_executor(inference_executor, _warm_up_model_sync, model_spec)
+            for _ in range(max(1, INFERENCE_WORKERS) if inference_executor is not None else 1)
+        ))
+    except Exception as e:
+        logging.error(f"Ошибка прогрева модели {model_version}: {e}", exc_info=True)
+        _model_warm_up_tasks.pop(model_spec["model_id"], None)
+        return
+    logging.info(f"Модель {model_version} прогрета за {time.perf_counter() - started_at:.2f} с, "
+                 f"процессы: {sorted(set(worker_pids))}")
+
+def schedule_model_warm_up(model_id: str):
+    """
+    Loads and primes a lazily loaded model in the background, once per model.
+    """
+    if not MODELS_CONFIG.get(model_id, {}).get("lazy") or model_id in _model_warm_up_tasks:
+        return
+    _model_warm_up_tasks[model_id] = asyncio.ensure_future(_warm_up_model(model_registry.get_spec(model_id)))
+
+def prepare_model_version(model_spec: dict):
+    """
+    Loads and primes a new model version in the inference workers before the registry activates it.
+    """
+    # Вызывается из потока реестра моделей; ленивую модель, которую еще не выбирали, заранее не грузим
+    if model_spec.get("lazy") and model_spec["model_id"] not in _model_warm_up_tasks:
+        return
+    if inference_executor is None:
+        _warm_up_model_sync(model_spec)
+        return
+    warm_up_futures = [inference_executor.submit(_warm_up_model_sync, model_spec) for _ in range(INFERENCE_WORKERS)]
+    worker_pids = [warm_up_future.result() for warm_up_future in warm_up_futures]
+    logging.info(f"Версия {format_model_version(model_spec)} загружена в процессах: {sorted(set(worker_pids))}")
+
+def _handle_inference_failure(e: Exception):
+    """
+    Recreates the inference pool in the background once a worker crash has broken it.
+    """
+    global _executor_restart_task
+    # Упавший воркер (OOM, segfault) ломает весь ProcessPoolExecutor: без перезапуска инференс не работает до рестарта бота
+    if isinstance(e, BrokenProcessPool) and (_executor_restart_task is None or _executor_restart_task.done()):
+        _executor_restart_task = asyncio.ensure_future(_restart_inference_executor())
+
+async def _restart_inference_executor():
+    global inference_executor
+    broken_executor = inference_executor
+    if broken_executor is None:
+        return
+    logging.error("Пул инференса сломан (процесс воркера завершился), перезапуск...")
+    inference_executor = None
+    _model_warm_up_tasks.clear()
+    broken_executor.shutdown(wait=False, cancel_futures=True)
+    try:
+        await start_inference_executor()
     except Exception as e:
-        logging.error(f"Ошибка при предсказании с моделью {model_friendly_name}: {e}", exc_info=True)
-        return f"Ошибка предсказания ({model_friendly_name})", None
\ No newline at end of file
+        logging.critical(f"Не удалось перезапустить пул инференса: {e}", exc_info=True)
+
+def shutdown_inference_executor():
+    global inference_executor
+    # Новые воркеры начнут без лениво загруженных моделей
+    _model_warm_up_tasks.clear()
+    if inference_executor is not None:
+        logging.info("Остановка пула инференса...")
+        inference_executor.shutdown(wait=True, cancel_futures=True)
+        inference_executor = None
+
+class InferenceBatcher:
+    """
+    Collects concurrent prediction requests per model version and scores them as one batch.
+    """
+    def __init__(self, max_batch_size: int, window_ms: int):
+        self.max_batch_size = max_batch_size
+        self.window_seconds = window_ms / 1000
+        self._pending = {}
+        self._flush_handles = {}
+        self._running_batches = set()
+
+    async def submit(self, news_text: str, model_spec: dict) -> tuple[str, float | None, dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Ключ - точная версия: запросы до и после подмены модели не смешиваются в одном батче
+        batch_key = format_model_version(model_spec)
+        pending = self._pending.setdefault(batch_key, (model_spec, []))[1]
+        pending.append((news_text, future))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(batch_key)
+        elif batch_key not in self._flush_handles:
+            self._flush_handles[batch_key] = loop.call_later(self.window_seconds, self._flush, batch_key)
+        return await future
+
+    def _flush(self, batch_key: str):
+        handle = self._flush_handles.pop(batch_key, None)
+        if handle is not None:
+            handle.cancel()
+        model_spec, batch = self._pending.pop(batch_key, (None, None))
+        if batch:
+            INFERENCE_BATCH_SIZE.observe(len(batch))
+            task = asyncio.ensure_future(self._run_batch(model_spec, batch))
+            self._running_batches.add(task)
+            task.add_done_callback(self._running_batches.discard)
+
+    async def _run_batch(self, model_spec: dict, batch: list):
+        loop = asyncio.get_running_loop()
+        texts = [news_text for news_text, _ in batch]
+        try:
+            results = await loop.run_in_executor(inference_executor, _predict_batch_sync, texts, model_spec)
+        except Exception as e:
+            logging.error(f"Ошибка выполнения батча ({len(batch)} текстов, модель "
+                          f"{format_model_version(model_spec)}): {e}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+inference_batcher = (InferenceBatcher(INFERENCE_BATCH_MAX_SIZE, INFERENCE_BATCH_WINDOW_MS)
+                     if INFERENCE_BATCH_MAX_SIZE > 1 else None)
+
+async def predict_fake_news(news_text: str, model_id: str, timings: dict | None = None,
+                            model_spec: dict | None = None) -> tuple[str, float | None]:
+    """
+    Predicts a label for the text; per-stage timings in milliseconds are written into `timings` if given.
+
+    `model_spec` pins an exact model version; by default the version active in the registry is used.
+    """
+    if model_spec is None:
+        if model_id not in MODELS_CONFIG:
+            logging.error(f"Запрошена неизвестная модель: {model_id}")
+            return "Ошибка: модель не найдена", None
+        model_spec = model_registry.get_spec(model_id)
+
+    started_at = time.perf_counter()
+    try:
+        if inference_batcher is not None:
+            label, probability, stage_timings = await inference_batcher.submit(news_text, model_spec)
+        else:
+            loop = asyncio.get_running_loop()
+            # Без пула процессов (inference_executor is None) предсказание уходит в стандартный пул потоков,
+            # чтобы не блокировать event loop
+            label, probability, stage_timings = await loop.run_in_executor(
+                inference_executor, _predict_sync, news_text, model_spec)
+    except Exception as e:
+        # Сбой пула (BrokenProcessPool, ошибка pickle) - пользователь получает ошибку, а не вечное "Анализирую..."
+        logging.error(f"Ошибка выполнения предсказания с моделью {format_model_version(model_spec)}: {e}",
+                      exc_info=True)
+        _handle_inference_failure(e)
+        return f"Ошибка предсказания ({model_spec.get('name', model_spec['model_id'])})", None
+
+    if timings is not None:
+        total_ms = (time.perf_counter() - started_at) * 1000
+        compute_ms = sum(stage_timings.get(stage, 0.0) for stage in COMPUTE_STAGES)
+        # Все, что не посчитано внутри воркера: окно батчинга, очередь пула и передача данных между процессами
+        timings.update(stage_timings, queue_wait_ms=max(0.0, total_ms - compute_ms))
+    return label, probability
+
+def _predict_sync(news_text: str, model_spec: dict) -> tuple[str, float | None, dict]:
+    return _predict_batch_sync([news_text], model_spec)[0]
+
+def _predict_batch_sync(news_texts: list[str], model_spec: dict) -> list[tuple[str, float | None, dict]]:
+    batch_size = len(news_texts)
+    model_version = format_model_version(model_spec)
+
+    try:
+        # Версия без прогрева (ленивая модель или воркер, не получивший прогрев) грузится здесь
+        vectorizer, selected_model = get_model_components(model_spec)
+    except Exception as e:
+        logging.error(f"ML компоненты модели {model_version} не загружены: {e}", exc_info=True)
+        return [("Ошибка: ML компоненты не готовы", None, {"batch_size": batch_size})] * batch_size
+
+    try:
+        preprocessed_texts = []
+        preprocess_ms = []
+        long_positions = []
+        for i, news_text in enumerate(news_texts):
+            if is_long_text(news_text):
+                # Длинные тексты скорятся по окнам отдельно от остального батча
+                long_positions.append(i)
+                preprocessed_texts.append("")
+                preprocess_ms.append(0.0)
+                continue
+            stage_started_at = time.perf_counter()
+            preprocessed_texts.append(preprocess_text(news_text))
+            preprocess_ms.append((time.perf_counter() - stage_started_at) * 1000)
+
+        results = [(UNPROCESSABLE_LABEL, None) for _ in news_texts]
+        vectorize_ms = predict_ms = 0.0
+        scored_positions = [i for i, text in enumerate(preprocessed_texts) if text.strip()]
+        if scored_positions:
+            # Один CSR-батч на все тексты вместо отдельного transform/predict на каждый
+            stage_started_at = time.perf_counter()
+            text_vectors = vectorizer.transform([preprocessed_texts[i] for i in scored_positions])
+            vectorize_ms = (time.perf_counter() - stage_started_at) * 1000
+
+            stage_started_at = time.perf_counter()
+            predictions, probabilities = score_text_vectors(selected_model, model_spec, text_vectors)
+            predict_ms = (time.perf_counter() - stage_started_at) * 1000
+
+            for position, prediction, probability in zip(scored_positions, predictions, probabilities):
+                results[position] = (prediction_to_label(prediction), float(probability))
+            logging.info(f"Предсказание с помощью '{model_version}': батч из {batch_size} текст(ов), "
+                         f"результаты: {results}")
+
+        chunk_timings = {}
+        for position in long_positions:
+            (results[position],), chunk_timings[position] = score_chunked_text(
+                news_texts[position], [model_spec], [(vectorizer, selected_model)])
+            chunk_timings[position]["batch_size"] = batch_size
+
+        # Векторизация и предсказание общие для батча, поэтому каждый запрос ждет их целиком
+        return [
+            (label, probability, chunk_timings.get(i) or {"preprocess_ms": preprocess_ms[i], "vectorize_ms": vectorize_ms,
+                                                          "predict_ms": predict_ms, "batch_size": batch_size})
+            for i, (label, probability) in enumerate(results)
+        ]
+    except Exception as e:
+        logging.error(f"Ошибка при предсказании с моделью {model_version}: {e}", exc_info=True)
+        model_friendly_name = model_spec.get("name", model_spec["model_id"])
+        return [(f"Ошибка предсказания ({model_friendly_name})", None, {"batch_size": batch_size})] * batch_size
+
+async def predict_all(news_text: str, model_ids: list[str] | None = None, timings: dict | None = None) -> dict:
+    """
+    Scores the text with several models over one shared preprocessing and vectorization.
+
+    Returns {"models": {model_id: {"label", "probability", "model_version"}}, "combined": {...}}.
+    """
+    model_specs = [model_registry.get_spec(model_id) for model_id in (model_ids or MODELS_CONFIG)]
+    loop = asyncio.get_running_loop()
+    started_at = time.perf_counter()
+    executor_failed = False
+    try:
+        model_results, stage_timings = await loop.run_in_executor(
+            inference_executor, _predict_all_sync, news_text, model_specs)
+    except Exception as e:
+        # Как в predict_fake_news: сбой пула превращается в ответ с ошибкой, а не в зависшее сообщение
+        logging.error(f"Ошибка выполнения предсказания всеми моделями: {e}", exc_info=True)
+        _handle_inference_failure(e)
+        executor_failed = True
+        model_results = [(f"Ошибка предсказания ({model_spec.get('name', model_spec['model_id'])})", None)
+                         for model_spec in model_specs]
+        stage_timings = {}
+
+    if timings is not None:
+        total_ms = (time.perf_counter() - started_at) * 1000
+        compute_ms = sum(stage_timings.get(stage, 0.0) for stage in COMPUTE_STAGES)
+        timings.update(stage_timings, queue_wait_ms=max(0.0, total_ms - compute_ms))
+
+    combined_label, combined_probability = combine_predictions(model_results)
+    if executor_failed:
+        combined_label = "Ошибка предсказания (все модели)"
+    model_versions = [format_model_version(model_spec) for model_spec in model_specs]
+    return {
+        "models": {
+            model_spec["model_id"]: {"label": label, "probability": probability, "model_version": model_version}
+            for model_spec, model_version, (label, probability) in zip(model_specs, model_versions, model_results)
+        },
+        "combined": {"label": combined_label, "probability": combined_probability,
+                     "model_version": f"ensemble@{'+'.join(model_versions)}"},
+    }
+
+def _score_single_vector(model, model_spec: dict, text_vector) -> tuple[str, float | None]:
+    try:
+        predictions, probabilities = score_text_vectors(model, model_spec, text_vector)
+        return prediction_to_label(predictions[0]), float(probabilities[0])
+    except Exception as e:
+        logging.error(f"Ошибка при предсказании с моделью {format_model_version(model_spec)}: {e}", exc_info=True)
+        return f"Ошибка предсказания ({model_spec.get('name', model_spec['model_id'])})", None
+
+def _predict_all_sync(news_text: str, model_specs: list[dict]) -> tuple[list[tuple[str, float | None]], dict]:
+    global _scoring_pool
+    stage_timings = {"preprocess_ms": 0.0, "vectorize_ms": 0.0, "predict_ms": 0.0, "batch_size": 1}
+    try:
+        components = [get_model_components(model_spec) for model_spec in model_specs]
+    except Exception as e:
+        logging.error(f"ML компоненты не загружены: {e}", exc_info=True)
+        return [("Ошибка: ML компоненты не готовы", None)] * len(model_specs), stage_timings
+
+    if is_long_text(news_text):
+        try:
+            return score_chunked_text(news_text, model_specs, components)
+        except Exception as e:
+            logging.error(f"Ошибка при оценке длинного текста моделями: {e}", exc_info=True)
+            return [("Ошибка предсказания (все модели)", None)] * len(model_specs), stage_timings
+
+    stage_started_at = time.perf_counter()
+    preprocessed_text = preprocess_text(news_text)
+    stage_timings["preprocess_ms"] = (time.perf_counter() - stage_started_at) * 1000
+    if not preprocessed_text.strip():
+        return [(UNPROCESSABLE_LABEL, None)] * len(model_specs), stage_timings
+
+    # Один sparse-вектор на векторизатор: модели с общим векторизатором переиспользуют его
+    stage_started_at = time.perf_counter()
+    vectors_by_path = {}
+    for model_spec, (vectorizer, _) in zip(model_specs, components):
+        if model_spec["vectorizer_path"] not in vectors_by_path:
+            vectors_by_path[model_spec["vectorizer_path"]] = vectorizer.transform([preprocessed_text])
+    stage_timings["vectorize_ms"] = (time.perf_counter() - stage_started_at) * 1000
+
+    stage_started_at = time.perf_counter()
+    scoring_args = [(model, model_spec, vectors_by_path[model_spec["vectorizer_path"]])
+                    for model_spec, (_, model) in zip(model_specs, components)]
+    if len(scoring_args) > 1:
+        # LightGBM и BLAS отпускают GIL, поэтому модели скорятся параллельно в потоках воркера
+        if _scoring_pool is None:
+            _scoring_pool = ThreadPoolExecutor(max_workers=len(MODELS_CONFIG), thread_name_prefix="scoring")
+        results = list(_scoring_pool.map(lambda args: _score_single_vector(*args), scoring_args))
+    else:
+        results = [_score_single_vector(*args) for args in scoring_args]
+    stage_timings["predict_ms"] = (time.perf_counter() - stage_started_at) * 1000
+    logging.info(f"Сравнение моделей {[format_model_version(spec) for spec in model_specs]}: результаты {results}")
+    return results, stage_timings
@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from .config import (MODELS_CONFIG, VECTORIZER_PATH, MODEL_MANIFEST_PATH, MODEL_REGISTRY_POLL_SECONDS,
+                     MODEL_REGISTRY_KEEP_VERSIONS, MODEL_PROFILE)
+
+
+# Пример манифеста (пути относительно каталога манифеста):
+# {"models": {"linear_svc": {"version": "2024-06-01", "path": "linear_svc/2024-06-01/model.pkl",
+#                            "vectorizer": "linear_svc/2024-06-01/vectorizer", "calibration": {"a": -1.7, "b": 0.1}}}}
+DEFAULT_MODEL_VERSION = "1.0"
+
+def format_model_version(model_spec: dict) -> str:
+    return f"{model_spec['model_id']}@{model_spec['version']}"
+
+def default_model_specs() -> dict[str, dict]:
+    return {
+        model_id: {
+            **config_data,
+            "model_id": model_id,
+            "version": config_data.get("version", DEFAULT_MODEL_VERSION),
+            "vectorizer_path": config_data.get("vectorizer_path", VECTORIZER_PATH),
+        }
+        for model_id, config_data in MODELS_CONFIG.items()
+    }
+
+def read_manifest(manifest_path: str) -> dict[str, dict]:
+    """
+    Returns model specs from the manifest merged over MODELS_CONFIG; without a manifest - MODELS_CONFIG as is.
+    """
+    model_specs = default_model_specs()
+    if not os.path.exists(manifest_path):
+        return model_specs
+
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    base_dir = os.path.dirname(manifest_path)
+    for model_id, entry in manifest.get("models", {}).items():
+        if model_id not in model_specs:
+            logging.warning(f"Модель '{model_id}' из манифеста {manifest_path} отсутствует в MODELS_CONFIG, пропущена.")
+            continue
+        if "version" not in entry or "path" not in entry:
+            raise ValueError(f"Для модели '{model_id}' в манифесте обязательны поля version и path")
+        if MODEL_PROFILE == "lite" and "vectorizer" not in entry:
+            # Иначе модель с полным словарем получила бы сокращенный векторизатор lite и упала на числе признаков
+            logging.warning(f"Модель '{model_id}' из манифеста {manifest_path} без своего vectorizer пропущена: "
+                            f"в профиле lite версия из манифеста должна нести векторизатор.")
+            continue
+        model_spec = model_specs[model_id]
+        model_spec["version"] = str(entry["version"])
+        model_spec["path"] = os.path.join(base_dir, entry["path"])
+        if "vectorizer" in entry:
+            model_spec["vectorizer_path"] = os.path.join(base_dir, entry["vectorizer"])
+        if "calibration" in entry:
+            model_spec["calibration"] = entry["calibration"]
+    return model_specs
+
+
+class LoadedModelCache:
+    """
+    Per-process cache of loaded models keyed by exact version, plus their vectorizers keyed by path.
+
+    At most `keep_versions` versions of each model stay in memory, so requests already routed
+    to the previous version finish on it; different artifacts load in parallel, the same one once.
+    """
+    def __init__(self, keep_versions: int):
+        self.keep_versions = max(1, keep_versions)
+        self._models = OrderedDict()
+        self._vectorizers = {}
+        self._vectorizer_paths = {}
+        self._lock = threading.Lock()
+        self._artifact_locks = {}
+
+    def get(self, model_spec: dict, load_vectorizer, load_model) -> tuple:
+        key = format_model_version(model_spec)
+        vectorizer_path = model_spec["vectorizer_path"]
+        model = self._get_or_load(self._models, key, lambda: load_model(model_spec["path"]))
+        vectorizer = self._get_or_load(self._vectorizers, vectorizer_path, lambda: load_vectorizer(vectorizer_path))
+        if key not in self._vectorizer_paths:
+            with self._lock:
+                self._vectorizer_paths[key] = vectorizer_path
+                self._evict(model_spec["model_id"])
+        return vectorizer, model
+
+    def loaded_versions(self) -> list[str]:
+        return list(self._models)
+
+    def _get_or_load(self, artifacts: dict, key: str, loader):
+        artifact = artifacts.get(key)
+        if artifact is not None:
+            return artifact
+        with self._lock:
+            artifact_lock = self._artifact_locks.setdefault(key, threading.Lock())
+        with artifact_lock:
+            artifact = artifacts.get(key)
+            if artifact is None:
+                artifact = loader()
+                artifacts[key] = artifact
+        return artifact
+
+    def _evict(self, model_id: str):
+        versions = [key for key in self._vectorizer_paths if key.split("@", 1)[0] == model_id]
+        for key in versions[:-self.keep_versions]:
+            self._models.pop(key, None)
+            self._vectorizer_paths.pop(key, None)
+            self._artifact_locks.pop(key, None)
+            logging.info(f"Версия модели {key} выгружена из памяти.")
+
+        used_paths = set(self._vectorizer_paths.values())
+        for path in [path for path in self._vectorizers if path not in used_paths]:
+            del self._vectorizers[path]
+            self._artifact_locks.pop(path, None)
+            logging.info(f"Векторизатор {path} выгружен из памяти.")
+
+
+class ModelRegistry:
+    """
+    Active model versions of the bot process; a background thread re-reads the manifest when it changes.
+
+    New versions are activated only after `prepare` (loading and warm-up) succeeds, so new requests switch
+    to them at once while requests that already resolved a spec keep the old version.
+    """
+    def __init__(self, manifest_path: str, poll_interval_seconds: float):
+        self.manifest_path = manifest_path
+        self.poll_interval_seconds = poll_interval_seconds
+        self._active_specs = read_manifest(manifest_path)
+        self._manifest_mtime = self._read_mtime()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def get_spec(self, model_id: str) -> dict:
+        return self._active_specs[model_id]
+
+    def model_version(self, model_id: str) -> str:
+        model_spec = self._active_specs.get(model_id)
+        return format_model_version(model_spec) if model_spec is not None else model_id
+
+    def active_versions(self) -> dict[str, str]:
+        return {model_id: format_model_version(model_spec) for model_id, model_spec in self._active_specs.items()}
+
+    def start_watching(self, prepare):
+        if self.poll_interval_seconds <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, args=(prepare,), name="model-registry", daemon=True)
+        self._thread.start()
+        logging.info(f"Отслеживание манифеста моделей {self.manifest_path} (каждые {self.poll_interval_seconds} с), "
+                     f"активные версии: {self.active_versions()}")
+
+    def stop_watching(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def refresh(self, prepare) -> list[str]:
+        """
+        Re-reads the manifest and activates changed versions that `prepare` loaded successfully.
+        """
+        manifest_mtime = self._read_mtime()
+        if manifest_mtime == self._manifest_mtime:
+            return []
+        # Недописанный манифест перечитается, когда запись завершится и mtime снова изменится
+        self._manifest_mtime = manifest_mtime
+        try:
+            new_specs = read_manifest(self.manifest_path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Не удалось прочитать манифест моделей {self.manifest_path}: {e}")
+            return []
+
+        activated = []
+        for model_id, model_spec in new_specs.items():
+            current_spec = self._active_specs.get(model_id)
+            if current_spec is not None and format_model_version(current_spec) == format_model_version(model_spec):
+                continue
+            try:
+                prepare(model_spec)
+            except Exception as e:
+                logging.error(f"Новая версия {format_model_version(model_spec)} не загружена, остается "
+                              f"{format_model_version(current_spec)}: {e}", exc_info=True)
+                continue
+            # Замена элемента словаря атомарна: новые запросы сразу получают новую версию
+            self._active_specs[model_id] = model_spec
+            activated.append(format_model_version(model_spec))
+            logging.info(f"Активирована версия модели {format_model_version(model_spec)}.")
+        return activated
+
+    def _watch(self, prepare):
+        while not self._stop_event.wait(self.poll_interval_seconds):
+            try:
+                self.refresh(prepare)
+            except Exception as e:
+                logging.error(f"Ошибка обновления реестра моделей: {e}", exc_info=True)
+
+    def _read_mtime(self) -> float | None:
+        try:
+            return os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return None
+
+
+model_registry = ModelRegistry(MODEL_MANIFEST_PATH, MODEL_REGISTRY_POLL_SECONDS)
+loaded_models = LoadedModelCache(MODEL_REGISTRY_KEEP_VERSIONS)
@@ -0,0 +1,62 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class QuantizedLinearModel:
+    """
+    Binary linear classifier with int8 or float16 weights over a pruned feature space.
+
+    decision_function is a sparse dot product computed from the nonzeros of X only, so weights are never
+    expanded to a dense float64 copy; it matches LinearSVC up to quantization error.
+    """
+    def __init__(self, coef: np.ndarray, intercept: float, classes: np.ndarray, weights_dtype: str):
+        coef = np.asarray(coef, dtype=np.float64)
+        if weights_dtype == "int8":
+            self.scale = float(np.abs(coef).max() / 127) if coef.size and np.abs(coef).max() > 0 else 1.0
+            self.weights = np.round(coef / self.scale).astype(np.int8)
+        elif weights_dtype == "float16":
+            self.scale = 1.0
+            self.weights = coef.astype(np.float16)
+        else:
+            raise ValueError(f"Неизвестный тип весов: {weights_dtype} (допустимо: int8, float16)")
+        self.intercept = float(intercept)
+        self.classes_ = np.asarray(classes)
+
+    def decision_function(self, X) -> np.ndarray:
+        X = csr_matrix(X)
+        row_ids = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+        products = X.data * self.weights[X.indices]
+        return np.bincount(row_ids, weights=products, minlength=X.shape[0]) * self.scale + self.intercept
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+class ColumnMappedModel:
+    """
+    Wraps a model trained on the full feature space so it accepts vectors of the pruned vocabulary.
+    """
+    def __init__(self, model, original_columns: np.ndarray, n_original_features: int):
+        self.model = model
+        # Колонки сокращенного словаря идут в исходном порядке, поэтому индексы в строках остаются отсортированными
+        self.original_columns = np.asarray(original_columns, dtype=np.int32)
+        self.n_original_features = n_original_features
+        self.classes_ = model.classes_
+        if hasattr(model, "predict_proba"):
+            self.predict_proba = lambda X: self.model.predict_proba(self._expand(X))
+        if hasattr(model, "decision_function"):
+            self.decision_function = lambda X: self.model.decision_function(self._expand(X))
+
+    def __getstate__(self):
+        return {key: value for key, value in self.__dict__.items() if key not in ("predict_proba", "decision_function")}
+
+    def __setstate__(self, state):
+        self.__init__(state["model"], state["original_columns"], state["n_original_features"])
+
+    def _expand(self, X) -> csr_matrix:
+        X = csr_matrix(X)
+        return csr_matrix((X.data, self.original_columns[X.indices], X.indptr),
+                          shape=(X.shape[0], self.n_original_features))
+
+    def predict(self, X) -> np.ndarray:
+        return self.model.predict(self._expand(X))
@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import string
+import time
+from collections import OrderedDict
+
+from .clickhouse_utils import find_recent_prediction
+from .config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_CLICKHOUSE_LOOKUP
+from .metrics import RESULT_CACHE_ENTRIES, RESULT_CACHE_HITS, RESULT_CACHE_MISSES
+from .ml_utils import predict_fake_news
+from .model_registry import model_registry, format_model_version
+
+
+_NORMALIZE_TABLE = str.maketrans('', '', string.punctuation)
+
+def make_cache_key(news_text: str, model_version: str) -> str:
+    # Те же первые шаги, что и в preprocess_text: регистр, ASCII-пунктуация, пробелы
+    normalized_text = " ".join(news_text.lower().translate(_NORMALIZE_TABLE).split())
+    return hashlib.sha256(f"{model_version}\x00{normalized_text}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Bounded in-process LRU cache of prediction results with per-entry TTL.
+    """
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> tuple[str, float | None] | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: tuple[str, float | None]):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+RESULT_CACHE_ENTRIES.set_function(lambda: len(result_cache))
+RESULT_CACHE_HITS.set_function(lambda: result_cache.hits)
+RESULT_CACHE_MISSES.set_function(lambda: result_cache.misses)
+
+async def predict_with_cache(news_text: str, model_id: str,
+                             timings: dict | None = None) -> tuple[str, float | None, bool, str]:
+    """
+    Returns (label, probability, is_cached, model_version), skipping the ML path for recently seen texts.
+    """
+    # Версия фиксируется один раз: подмена модели во время запроса не влияет на его результат и лог
+    model_spec = model_registry.get_spec(model_id)
+    model_version = format_model_version(model_spec)
+    cache_key = make_cache_key(news_text, model_version)
+    cached_result = result_cache.get(cache_key)
+    if cached_result is None and RESULT_CACHE_CLICKHOUSE_LOOKUP:
+        cached_result = await find_recent_prediction(news_text, model_version, RESULT_CACHE_TTL_SECONDS)
+        if cached_result is not None:
+            result_cache.put(cache_key, cached_result)
+
+    if cached_result is not None:
+        label, probability = cached_result
+        logging.info(f"Результат для модели {model_id} взят из кэша (статистика кэша: {result_cache.stats()})")
+        return label, probability, True, model_version
+
+    label, probability = await predict_fake_news(news_text, model_id, timings, model_spec=model_spec)
+    # Ошибки и необработанные тексты приходят без вероятности и не кэшируются
+    if probability is not None:
+        result_cache.put(cache_key, (label, probability))
+    return label, probability, False, model_version
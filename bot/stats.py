@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import json
+import math
+
+from .clickhouse_utils import fetch_model_stats
+from .config import STATS_DEFAULT_HOURS, setup_logging
+
+
+def _format_ms(value: float) -> str:
+    return "—" if value is None or math.isnan(value) else f"{value:.0f}"
+
+def format_model_stats(stats: list[dict], hours: int) -> str:
+    """
+    Renders fetch_model_stats rows as plain text for the /stats reply and the CLI.
+    """
+    if not stats:
+        return f"За последние {hours} ч запросов нет."
+
+    lines = [f"Статистика моделей за последние {hours} ч:"]
+    for model_stats in stats:
+        requests = model_stats["requests"]
+        labels = ", ".join(f"{label}: {count / requests:.0%}"
+                           for label, count in sorted(model_stats["labels"].items()) if requests and count)
+        processing_time = model_stats["processing_time_ms"]
+        predict_time = model_stats["predict_time_ms"]
+        lines.append("")
+        lines.append(model_stats["model_version"])
+        lines.append(f"  Запросов: {requests} (из кэша: {model_stats['cached_requests']})")
+        if labels:
+            lines.append(f"  Вердикты: {labels}")
+        lines.append(f"  Обработка p50/p95/p99, мс: {_format_ms(processing_time['p50'])}/"
+                     f"{_format_ms(processing_time['p95'])}/{_format_ms(processing_time['p99'])}")
+        lines.append(f"  Модель p50/p95/p99, мс: {_format_ms(predict_time['p50'])}/"
+                     f"{_format_ms(predict_time['p95'])}/{_format_ms(predict_time['p99'])}")
+        if model_stats["feedback_total"]:
+            agreement = model_stats["feedback_correct"] / model_stats["feedback_total"]
+            lines.append(f"  Согласие с отзывами: {agreement:.0%} (отзывов: {model_stats['feedback_total']})")
+        else:
+            lines.append("  Отзывов нет")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Качество и задержки моделей по версиям из агрегатов ClickHouse.")
+    parser.add_argument("--hours", type=int, default=STATS_DEFAULT_HOURS, help="Окно в часах")
+    parser.add_argument("--json", action="store_true", help="Вывести JSON вместо текста")
+    args = parser.parse_args()
+
+    setup_logging()
+    stats = asyncio.run(fetch_model_stats(args.hours))
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    else:
+        print(format_model_stats(stats, args.hours))
+
+if __name__ == "__main__":
+    main()
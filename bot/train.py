@@ -0,0 +1,327 @@
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+from . import ml_utils
+from .check_preprocessing import DEFAULT_CORPUS_FILES
+from .clickhouse_utils import execute_query, news_text_hash
+from .compact_vectorizer import load_vectorizer
+from .config import CH_DB, MODELS_CONFIG, MODEL_MANIFEST_PATH, setup_logging
+from .holdout import NOTEBOOK_FILE_LABELS, corpus_file_label, iter_notebook_corpus_texts
+from .model_registry import model_registry
+
+
+# Классы как в fake-news.ipynb и prediction_to_label: 1 - фейк, 0 - настоящая новость
+CLASSES = np.array([0, 1])
+DEFAULT_N_FEATURES = 2 ** 20
+# Каждый N-й текст (по хешу содержимого) уходит в отложенную выборку для калибровки и оценки
+HOLDOUT_EVERY = 10
+FEEDBACK_TEXTS_BATCH_SIZE = 1000
+
+def create_hashing_vectorizer(n_features: int) -> HashingVectorizer:
+    # Без словаря: векторизатор не обучается, поэтому чанки векторизуются в разных процессах независимо
+    return HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False, norm="l2")
+
+def _iter_corpus_file_samples(path: str, limit: int | None):
+    # Очистка и дедупликация как в ноутбуке - до хеширования для отложенной выборки, иначе
+    # префикс "(Reuters)" из True.csv попадает в признаки, а дубликаты - по обе стороны разбиения
+    label = corpus_file_label(path)
+    for text in iter_notebook_corpus_texts(path, limit):
+        yield text, label, 1.0
+
+def iter_corpus_samples(paths: list[str], limit: int | None = None):
+    # Файлы читаются по очереди построчно: каждый файл корпуса - один класс, и чтение подряд
+    # дало бы чанки partial_fit из одного класса
+    sources = [_iter_corpus_file_samples(path, limit) for path in paths]
+    while sources:
+        for source in list(sources):
+            sample = next(source, None)
+            if sample is None:
+                sources.remove(source)
+            else:
+                yield sample
+
+def shuffle_buffered(samples, buffer_size: int, rng: random.Random):
+    """
+    Yields samples in random order within a sliding buffer of `buffer_size`, keeping memory bounded.
+    """
+    buffer = []
+    for sample in samples:
+        if len(buffer) < buffer_size:
+            buffer.append(sample)
+            continue
+        index = rng.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = sample
+    rng.shuffle(buffer)
+    yield from buffer
+
+def iter_feedback_samples(days: int, weight: float):
+    """
+    Yields (text, label, weight) for rated requests of the last `days` days; the label is the user's verdict.
+    """
+    # Отзывов немного: они справа в JOIN, а requests_log фильтруется по времени
+    rated_requests = execute_query(f"""
+        SELECT r.text_hash, r.predicted_label, f.user_rating
+        FROM {CH_DB}.requests_log AS r
+        INNER JOIN (
+            SELECT request_id, user_rating
+            FROM {CH_DB}.feedback
+            WHERE feedback_timestamp >= now() - toIntervalDay(%(days)s)
+        ) AS f ON f.request_id = r.request_id
+        WHERE r.request_timestamp >= now() - toIntervalDay(%(days)s)
+          AND r.predicted_label IN (%(fake_label)s, %(real_label)s)
+    """, {"days": days, "fake_label": ml_utils.FAKE_LABEL, "real_label": ml_utils.REAL_LABEL})
+    logging.info(f"Отзывов с вердиктом FAKE/REAL за {days} дн.: {len(rated_requests)}")
+
+    missing_texts = 0
+    for batch_start in range(0, len(rated_requests), FEEDBACK_TEXTS_BATCH_SIZE):
+        batch = rated_requests[batch_start:batch_start + FEEDBACK_TEXTS_BATCH_SIZE]
+        texts = dict(execute_query(
+            f"SELECT text_hash, any(news_text) FROM {CH_DB}.news_texts WHERE text_hash IN %(hashes)s GROUP BY text_hash",
+            {"hashes": tuple({text_hash for text_hash, _, _ in batch})},
+        ))
+        for text_hash, predicted_label, user_rating in batch:
+            if text_hash not in texts:
+                # Текст уже удален по TTL news_texts
+                missing_texts += 1
+                continue
+            predicted_class = 1 if predicted_label == ml_utils.FAKE_LABEL else 0
+            yield texts[text_hash], predicted_class if user_rating == "correct" else 1 - predicted_class, weight
+    if missing_texts:
+        logging.warning(f"Пропущено отзывов без сохраненного текста: {missing_texts}")
+
+def iter_chunks(samples, chunk_size: int):
+    chunk = []
+    for sample in samples:
+        chunk.append(sample)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def vectorize_chunk(samples: list[tuple[str, int, float]], n_features: int) -> tuple:
+    """
+    Preprocesses and hashes a chunk, returning (X, y, sample_weight, holdout_mask).
+    """
+    # Как в ноутбуке: тексты, пустые после предобработки, не участвуют ни в обучении, ни в оценке
+    kept_samples = []
+    for text, label, weight in samples:
+        preprocessed_text = ml_utils.preprocess_text(text)
+        if preprocessed_text:
+            kept_samples.append((text, preprocessed_text, label, weight))
+    if not kept_samples:
+        return csr_matrix((0, n_features)), np.array([], dtype=int), np.array([]), np.array([], dtype=bool)
+    texts, preprocessed_texts, labels, weights = zip(*kept_samples)
+    vectors = create_hashing_vectorizer(n_features).transform(preprocessed_texts)
+    holdout_mask = np.array([news_text_hash(text) % HOLDOUT_EVERY == 0 for text in texts])
+    return vectors, np.array(labels), np.array(weights, dtype=float), holdout_mask
+
+def _init_training_worker():
+    setup_logging()
+    ml_utils.load_nltk_components()
+
+def map_bounded(pool: ProcessPoolExecutor | None, function, items, max_pending: int, *args):
+    # executor.map отправил бы в пул весь поток сразу; держим в работе не больше max_pending чанков
+    if pool is None:
+        for item in items:
+            yield function(item, *args)
+        return
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, item, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def fit_platt_calibration(scores: np.ndarray, labels: np.ndarray) -> dict:
+    """
+    Fits P(class 1 | f) = 1 / (1 + exp(a * f + b)) on held-out decision scores, as used by score_text_vectors.
+    """
+    logistic = LogisticRegression(C=1e6).fit(scores.reshape(-1, 1), labels)
+    return {"a": float(-logistic.coef_[0][0]), "b": float(-logistic.intercept_[0])}
+
+def load_base_model(model_id: str, n_features: int) -> SGDClassifier:
+    model_spec = model_registry.get_spec(model_id)
+    model = joblib.load(model_spec["path"])
+    vectorizer = load_vectorizer(model_spec["vectorizer_path"])
+    if not hasattr(model, "partial_fit") or not isinstance(vectorizer, HashingVectorizer):
+        raise ValueError(f"Активная версия {model_registry.model_version(model_id)} обучена не этим пайплайном "
+                         f"(нужны partial_fit и HashingVectorizer), дообучение невозможно")
+    if vectorizer.n_features != n_features:
+        raise ValueError(f"У активной версии n_features={vectorizer.n_features}, запрошено {n_features}")
+    logging.info(f"Дообучение активной версии {model_registry.model_version(model_id)}")
+    return model
+
+def train(args) -> dict:
+    model = load_base_model(args.model_id, args.n_features) if args.incremental else SGDClassifier(
+        loss=args.loss, alpha=args.alpha, random_state=args.seed)
+
+    samples = []
+    if not args.skip_corpus:
+        samples.append(iter_corpus_samples(args.corpus, args.limit))
+    if args.feedback_days > 0:
+        samples.append(iter_feedback_samples(args.feedback_days, args.feedback_weight))
+    if not samples:
+        raise ValueError("Нет источников данных: корпус пропущен и отзывы отключены")
+
+    def iter_all_samples():
+        for source in samples:
+            yield from source
+
+    pool = None
+    if args.workers > 0:
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_training_worker)
+    else:
+        ml_utils.load_nltk_components()
+
+    started_at = time.perf_counter()
+    train_chunks = []
+    holdout_vectors, holdout_labels = [], []
+    train_rows = 0
+    single_class_chunks = 0
+    try:
+        shuffled_samples = shuffle_buffered(iter_all_samples(), max(1, args.shuffle_buffer), random.Random(args.seed))
+        chunks = iter_chunks(shuffled_samples, args.chunk_size)
+        for vectors, labels, weights, holdout_mask in map_bounded(pool, vectorize_chunk, chunks, args.workers * 2,
+                                                                  args.n_features):
+            train_mask = ~holdout_mask
+            if train_mask.any():
+                if len(np.unique(labels[train_mask])) < len(CLASSES):
+                    single_class_chunks += 1
+                model.partial_fit(vectors[train_mask], labels[train_mask], classes=CLASSES,
+                                  sample_weight=weights[train_mask])
+                train_rows += int(train_mask.sum())
+                if args.epochs > 1:
+                    train_chunks.append((vectors[train_mask], labels[train_mask], weights[train_mask]))
+            if holdout_mask.any():
+                holdout_vectors.append(vectors[holdout_mask])
+                holdout_labels.append(labels[holdout_mask])
+            logging.info(f"Обучено на {train_rows} строках ({time.perf_counter() - started_at:.1f} с)")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if not train_rows:
+        raise ValueError("Нет данных для обучения")
+    if single_class_chunks:
+        logging.warning(f"Чанков с одним классом: {single_class_chunks}; SGD на таких чанках смещается к этому "
+                        f"классу - увеличьте --shuffle-buffer или --chunk-size")
+    # Следующие эпохи - по векторизованным чанкам в памяти, в случайном порядке чанков и строк внутри них
+    rng = random.Random(args.seed)
+    row_rng = np.random.default_rng(args.seed)
+    for epoch in range(2, args.epochs + 1):
+        rng.shuffle(train_chunks)
+        for vectors, labels, weights in train_chunks:
+            order = row_rng.permutation(len(labels))
+            model.partial_fit(vectors[order], labels[order], sample_weight=weights[order])
+        logging.info(f"Эпоха {epoch}/{args.epochs} завершена ({time.perf_counter() - started_at:.1f} с)")
+
+    report = {"train_rows": train_rows, "single_class_chunks": single_class_chunks, "holdout_rows": 0,
+              "train_seconds": time.perf_counter() - started_at, "loss": model.loss, "n_features": args.n_features,
+              "epochs": args.epochs, "accuracy": None}
+    model_spec = {"model_id": args.model_id}
+    if holdout_labels:
+        holdout_x = vstack(holdout_vectors)
+        holdout_y = np.concatenate(holdout_labels)
+        if not hasattr(model, "predict_proba"):
+            model_spec["calibration"] = fit_platt_calibration(model.decision_function(holdout_x), holdout_y)
+        predictions, _ = ml_utils.score_text_vectors(model, model_spec, holdout_x)
+        report.update(holdout_rows=len(holdout_y), accuracy=float(np.mean(predictions == holdout_y)))
+    report["calibration"] = model_spec.get("calibration")
+    logging.info(f"Итоги обучения: {json.dumps(report, ensure_ascii=False)}")
+    return {"model": model, "vectorizer": create_hashing_vectorizer(args.n_features), "report": report}
+
+def save_artifacts(result: dict, model_id: str, manifest_path: str) -> dict:
+    """
+    Writes the model, vectorizer and report to <manifest dir>/<model_id>/<version>/, returns the manifest entry.
+    """
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    relative_dir = os.path.join(model_id, version)
+    artifact_dir = os.path.join(os.path.dirname(manifest_path), relative_dir)
+    os.makedirs(artifact_dir, exist_ok=True)
+    joblib.dump(result["model"], os.path.join(artifact_dir, "model.pkl"))
+    joblib.dump(result["vectorizer"], os.path.join(artifact_dir, "vectorizer.pkl"))
+    with open(os.path.join(artifact_dir, "report.json"), "w", encoding="utf-8") as report_file:
+        json.dump(result["report"], report_file, ensure_ascii=False, indent=2)
+
+    entry = {
+        "version": version,
+        "path": os.path.join(relative_dir, "model.pkl"),
+        "vectorizer": os.path.join(relative_dir, "vectorizer.pkl"),
+    }
+    if result["report"]["calibration"] is not None:
+        entry["calibration"] = result["report"]["calibration"]
+    logging.info(f"Артефакты версии {model_id}@{version} сохранены в {artifact_dir}")
+    return entry
+
+def publish_to_manifest(manifest_path: str, model_id: str, entry: dict):
+    manifest = {"models": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    manifest.setdefault("models", {})[model_id] = entry
+    # Атомарная замена: реестр бота не прочитает недописанный манифест
+    temporary_path = f"{manifest_path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, manifest_path)
+    logging.info(f"Манифест {manifest_path} обновлен: {model_id}@{entry['version']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Обучение линейной модели на корпусе и отзывах пользователей "
+                                                 "(HashingVectorizer + SGD partial_fit) с публикацией версии в манифест.")
+    parser.add_argument("--corpus", nargs="+", default=DEFAULT_CORPUS_FILES,
+                        help=f"CSV корпуса, класс по имени файла: {NOTEBOOK_FILE_LABELS}")
+    parser.add_argument("--skip-corpus", action="store_true", help="Учиться только на отзывах (с --incremental)")
+    parser.add_argument("--limit", type=int, default=None, help="Строк из каждого файла корпуса")
+    parser.add_argument("--feedback-days", type=int, default=90, help="Окно отзывов из ClickHouse в днях (0 - без них)")
+    parser.add_argument("--feedback-weight", type=float, default=2.0, help="Вес примера из отзыва")
+    parser.add_argument("--model-id", choices=list(MODELS_CONFIG), default="linear_svc",
+                        help="Слот модели в MODELS_CONFIG и манифесте")
+    parser.add_argument("--incremental", action="store_true", help="Дообучить активную версию, а не начать с нуля")
+    parser.add_argument("--loss", choices=["hinge", "log_loss", "modified_huber"], default="hinge")
+    parser.add_argument("--alpha", type=float, default=1e-5, help="Регуляризация SGDClassifier")
+    parser.add_argument("--n-features", type=int, default=DEFAULT_N_FEATURES)
+    parser.add_argument("--epochs", type=int, default=3, help="Эпохи; после первой чанки держатся в памяти")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--shuffle-buffer", type=int, default=20000,
+                        help="Размер буфера перемешивания примеров перед разбиением на чанки")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Процессы для предобработки и хеширования (0 - в основном процессе)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--manifest", default=MODEL_MANIFEST_PATH)
+    parser.add_argument("--min-accuracy", type=float, default=0.9,
+                        help="Не публиковать версию с точностью на отложенной выборке ниже порога")
+    parser.add_argument("--no-publish", action="store_true", help="Только сохранить артефакты, манифест не менять")
+    args = parser.parse_args()
+
+    setup_logging()
+    result = train(args)
+    entry = save_artifacts(result, args.model_id, args.manifest)
+
+    accuracy = result["report"]["accuracy"]
+    if accuracy is not None and accuracy < args.min_accuracy:
+        logging.error(f"Точность {accuracy:.4f} ниже порога {args.min_accuracy}, версия не опубликована.")
+        raise SystemExit(1)
+    if accuracy is None:
+        logging.warning("Отложенная выборка пуста: точность и калибровка не оценены.")
+    if not args.no_publish:
+        publish_to_manifest(args.manifest, args.model_id, entry)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+
+from aiohttp import ClientSession, web
+
+from .config import MODELS_CONFIG, ALL_MODELS_ID, ALL_MODELS_NAME, MAX_NEWS_TEXT_LENGTH, setup_logging
+
+
+RESULT_PREFIX = "Результат"
+DEFAULT_TEXTS = [
+    "Breaking: secret documents reveal the government is hiding the truth about the election results.",
+    "The central bank raised interest rates by 25 basis points on Wednesday, citing persistent inflation.",
+]
+
+class FakeTelegramAPI:
+    """
+    Minimal Bot API server: answers every method and records when a chat receives its result message.
+    """
+    def __init__(self):
+        self.waiters = {}
+        self._message_ids = itertools.count(1)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        fields = dict(await request.post()) if request.can_read_body else {}
+        if not fields and request.query:
+            fields = dict(request.query)
+
+        text = fields.get("text", "")
+        chat_id = int(fields["chat_id"]) if "chat_id" in fields else None
+        if method in ("sendmessage", "editmessagetext") and chat_id is not None:
+            waiter = self.waiters.get(chat_id)
+            if text.startswith(RESULT_PREFIX) and waiter is not None and not waiter.done():
+                waiter.set_result(time.perf_counter())
+            message = {
+                "message_id": int(fields.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": text,
+            }
+            return web.json_response({"ok": True, "result": message})
+        if method == "getme":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "LoadTest",
+                                                             "username": "load_test_bot"}})
+        return web.json_response({"ok": True, "result": True})
+
+
+class UpdateFactory:
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def message(self, user_id: int, text: str) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": next(self._update_ids), "message": message}
+
+
+async def run_user_session(session: ClientSession, webhook_url: str, api: FakeTelegramAPI, updates: UpdateFactory,
+                           user_id: int, model_name: str, news_text: str, timeout: float) -> dict:
+    loop = asyncio.get_running_loop()
+    for text in ("/analyze", model_name):
+        async with session.post(webhook_url, json=updates.message(user_id, text)) as response:
+            await response.read()
+
+    api.waiters[user_id] = loop.create_future()
+    started_at = time.perf_counter()
+    async with session.post(webhook_url, json=updates.message(user_id, news_text)) as response:
+        await response.read()
+        webhook_status = response.status
+    webhook_response_ms = (time.perf_counter() - started_at) * 1000
+    try:
+        finished_at = await asyncio.wait_for(api.waiters[user_id], timeout)
+        end_to_end_ms = (finished_at - started_at) * 1000
+    except asyncio.TimeoutError:
+        end_to_end_ms = None
+    finally:
+        api.waiters.pop(user_id, None)
+    return {"status": webhook_status, "webhook_response_ms": webhook_response_ms, "end_to_end_ms": end_to_end_ms}
+
+async def wait_for_webhook(session: ClientSession, webhook_url: str, wait_seconds: float):
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        try:
+            async with session.get(webhook_url) as response:
+                await response.read()
+                return
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(1)
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def load_texts(path: str | None, limit: int, max_length: int) -> tuple[list[str], int]:
+    """
+    Returns corpus texts cut to `max_length` characters, as Telegram limits real messages, and how many were cut.
+    """
+    if not path:
+        return DEFAULT_TEXTS, 0
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline="", encoding="utf-8") as corpus_file:
+        rows = itertools.islice(csv.DictReader(corpus_file), limit)
+        texts = [f"{row.get('title', '')} {row.get('text', '')}" for row in rows]
+    if max_length <= 0:
+        return texts, 0
+    truncated = sum(1 for text in texts if len(text) > max_length)
+    return [text[:max_length] for text in texts], truncated
+
+async def run_load_test(args) -> dict:
+    api = FakeTelegramAPI()
+    app = web.Application()
+    app.router.add_route("*", "/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.api_host, args.api_port).start()
+    logging.info(f"Тестовый Bot API сервер: http://{args.api_host}:{args.api_port}. Запустите бота с "
+                 f"TELEGRAM_API_SERVER=http://{args.api_host}:{args.api_port} и BOT_RUN_MODE=webhook, "
+                 f"ожидание вебхука {args.webhook_url}...")
+
+    # Иначе длинные статьи отклоняет AdmissionMiddleware и они считаются таймаутами, а не временем инференса
+    texts, truncated_texts = load_texts(args.corpus, args.requests, args.max_text_length)
+    if truncated_texts:
+        logging.info(f"Текстов обрезано до {args.max_text_length} символов: {truncated_texts} из {len(texts)}")
+    model_name = ALL_MODELS_NAME if args.model == ALL_MODELS_ID else MODELS_CONFIG[args.model]["name"]
+    updates = UpdateFactory()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded_session(session: ClientSession, request_number: int) -> dict:
+        async with semaphore:
+            # Каждый запрос от отдельного пользователя, чтобы состояния FSM не пересекались
+            user_id = args.first_user_id + request_number
+            return await run_user_session(session, args.webhook_url, api, updates, user_id, model_name,
+                                          random.choice(texts), args.timeout)
+
+    async with ClientSession() as session:
+        await wait_for_webhook(session, args.webhook_url, args.wait_seconds)
+        started_at = time.perf_counter()
+        results = await asyncio.gather(*(bounded_session(session, i) for i in range(args.requests)))
+    elapsed_seconds = time.perf_counter() - started_at
+    await runner.cleanup()
+
+    end_to_end = [result["end_to_end_ms"] for result in results if result["end_to_end_ms"] is not None]
+    webhook_response = [result["webhook_response_ms"] for result in results]
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "model": args.model,
+        "truncated_texts": truncated_texts,
+        "completed": len(end_to_end),
+        "timed_out": args.requests - len(end_to_end),
+        "http_errors": sum(1 for result in results if result["status"] != 200),
+        "throughput_rps": len(end_to_end) / elapsed_seconds if elapsed_seconds else 0.0,
+        "webhook_response_ms": {"p50": percentile(webhook_response, 50), "p95": percentile(webhook_response, 95),
+                                "p99": percentile(webhook_response, 99)},
+    }
+    if end_to_end:
+        report["end_to_end_ms"] = {"mean": statistics.fmean(end_to_end), "p50": percentile(end_to_end, 50),
+                                   "p95": percentile(end_to_end, 95), "p99": percentile(end_to_end, 99)}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест вебхука: отправляет фейковые апдейты Telegram "
+                                                 "и измеряет задержку до ответа бота.")
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--api-host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--model", default=next(iter(MODELS_CONFIG)), choices=[*MODELS_CONFIG, ALL_MODELS_ID])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--corpus", default=None, help="CSV с колонками title и text (например, data/Fake.csv)")
+    parser.add_argument("--max-text-length", type=int, default=MAX_NEWS_TEXT_LENGTH,
+                        help="Обрезать тексты корпуса до этой длины, как ограничение Telegram (0 - не обрезать)")
+    parser.add_argument("--first-user-id", type=int, default=10_000_000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--wait-seconds", type=float, default=120.0, help="Сколько ждать запуска бота")
+    args = parser.parse_args()
+
+    setup_logging()
+    report = asyncio.run(run_load_test(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
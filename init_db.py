@@ -17,6 +17,176 @@ CH_USER_BOT = os.getenv("CH_USER", "bot_user")
 CH_PASSWORD_BOT = os.getenv("CH_PASSWORD", "bot_password")
 
 
+# Сколько дней хранится текст новости после последнего запроса с ним
+NEWS_TEXT_TTL_DAYS = int(os.getenv("NEWS_TEXT_TTL_DAYS", 90))
+# Типы и кодеки колонок requests_log, которые применяются и к таблицам, созданным раньше
+REQUESTS_LOG_STORAGE_COLUMNS = {
+    "user_id": "Int64 CODEC(T64, ZSTD(1))",
+    "chat_id": "Int64 CODEC(T64, ZSTD(1))",
+    "message_id": "Int64 CODEC(T64, ZSTD(1))",
+    "request_timestamp": "DateTime DEFAULT now() CODEC(Delta, ZSTD(1))",
+    "predicted_label": "LowCardinality(String)",
+    "prediction_probability": "Float32 CODEC(ZSTD(1))",
+    "model_version": "LowCardinality(String) DEFAULT '1.0'",
+    "processing_time_ms": "UInt32 CODEC(T64, ZSTD(1))",
+    "is_cached": "UInt8 DEFAULT 0 CODEC(ZSTD(1))",
+    "queue_wait_ms": "Float32 DEFAULT 0 CODEC(ZSTD(1))",
+    "preprocess_ms": "Float32 DEFAULT 0 CODEC(ZSTD(1))",
+    "vectorize_ms": "Float32 DEFAULT 0 CODEC(ZSTD(1))",
+    "predict_ms": "Float32 DEFAULT 0 CODEC(ZSTD(1))",
+    "telegram_ms": "Float32 DEFAULT 0 CODEC(ZSTD(1))",
+}
+
+def migrate_requests_log_storage(bot_client: Client):
+    """
+    Moves news texts out of requests_log into the content-addressed news_texts table and compacts column types.
+
+    New rows reference texts by text_hash; texts of existing rows are moved by backfill_news_texts.py,
+    which also drops the old news_text column. Type changes rewrite the column once, codec changes
+    apply to new parts and to old ones as they merge.
+    """
+    bot_client.execute(f"""
+    CREATE TABLE IF NOT EXISTS {CH_DB_NAME}.news_texts (
+        text_hash UInt64, -- первые 8 байт SHA-256 текста (little-endian)
+        news_text String CODEC(ZSTD(3)),
+        last_seen DateTime DEFAULT now() CODEC(Delta, ZSTD(1))
+    ) ENGINE = ReplacingMergeTree(last_seen)
+    ORDER BY text_hash
+    TTL last_seen + INTERVAL {NEWS_TEXT_TTL_DAYS} DAY
+    """)
+    bot_client.execute(f"ALTER TABLE {CH_DB_NAME}.news_texts MODIFY TTL last_seen + INTERVAL {NEWS_TEXT_TTL_DAYS} DAY")
+    logging.info(f"Таблица 'news_texts' создана или уже существует (тексты хранятся {NEWS_TEXT_TTL_DAYS} дн.).")
+
+    bot_client.execute(f"ALTER TABLE {CH_DB_NAME}.requests_log ADD COLUMN IF NOT EXISTS text_hash UInt64 AFTER request_timestamp")
+    for column, definition in REQUESTS_LOG_STORAGE_COLUMNS.items():
+        # Если тип уже совпадает, ClickHouse меняет только метаданные без перезаписи данных
+        bot_client.execute(f"ALTER TABLE {CH_DB_NAME}.requests_log MODIFY COLUMN {column} {definition}")
+    has_news_text = bot_client.execute(
+        "SELECT count() FROM system.columns WHERE database = %(database)s AND table = 'requests_log' AND name = 'news_text'",
+        {"database": CH_DB_NAME},
+    )[0][0]
+    if has_news_text:
+        logging.warning("В requests_log осталась колонка news_text: запустите backfill_news_texts.py, чтобы перенести "
+                        "тексты в news_texts и удалить ее.")
+
+STATS_QUANTILES = "0.5, 0.95, 0.99"
+
+def create_stats_views(bot_client: Client):
+    """
+    Creates hourly per-model_version aggregates maintained by materialized views on insert.
+
+    model_stats_hourly holds request counts by label, latency quantile states and feedback counts;
+    feedback is attributed to the hour, version and label of its request through request_versions,
+    a compact copy of requests_log keyed by request_id.
+    """
+    stats_table_exists = bot_client.execute(f"EXISTS TABLE {CH_DB_NAME}.model_stats_hourly")[0][0]
+    # Все, что вставлено раньше этого момента, переносится в агрегаты вручную ниже
+    backfill_before = bot_client.execute("SELECT now()")[0][0]
+
+    bot_client.execute(f"""
+    CREATE TABLE IF NOT EXISTS {CH_DB_NAME}.model_stats_hourly (
+        hour DateTime,
+        model_version LowCardinality(String),
+        predicted_label LowCardinality(String),
+        requests SimpleAggregateFunction(sum, UInt64),
+        cached_requests SimpleAggregateFunction(sum, UInt64),
+        processing_time_quantiles AggregateFunction(quantilesTDigest({STATS_QUANTILES}), UInt32),
+        predict_time_quantiles AggregateFunction(quantilesTDigest({STATS_QUANTILES}), Float32),
+        feedback_total SimpleAggregateFunction(sum, UInt64),
+        feedback_correct SimpleAggregateFunction(sum, UInt64)
+    ) ENGINE = AggregatingMergeTree()
+    ORDER BY (hour, model_version, predicted_label)
+    PARTITION BY toYYYYMM(hour)
+    """)
+    # Отзыв приходит после запроса: по request_id (ключ сортировки) находим его версию модели и час
+    bot_client.execute(f"""
+    CREATE TABLE IF NOT EXISTS {CH_DB_NAME}.request_versions (
+        request_id UUID,
+        request_hour DateTime,
+        model_version LowCardinality(String),
+        predicted_label LowCardinality(String)
+    ) ENGINE = MergeTree()
+    ORDER BY request_id
+    TTL request_hour + INTERVAL 90 DAY
+    """)
+
+    requests_stats_select = f"""
+        SELECT
+            toStartOfHour(request_timestamp) AS hour,
+            model_version,
+            predicted_label,
+            count() AS requests,
+            sum(is_cached) AS cached_requests,
+            -- Квантили задержек считаются только по запросам, прошедшим через модель
+            quantilesTDigestStateIf({STATS_QUANTILES})(processing_time_ms, is_cached = 0) AS processing_time_quantiles,
+            quantilesTDigestStateIf({STATS_QUANTILES})(predict_ms, is_cached = 0) AS predict_time_quantiles
+        FROM {CH_DB_NAME}.requests_log
+    """
+    request_versions_select = f"""
+        SELECT request_id, toStartOfHour(request_timestamp) AS request_hour, model_version, predicted_label
+        FROM {CH_DB_NAME}.requests_log
+    """
+    # В materialized view {CH_DB_NAME}.feedback во вложенном запросе тоже означает только вставленный блок,
+    # поэтому request_versions читается по первичному ключу, а не целиком
+    feedback_stats_select = f"""
+        SELECT
+            r.request_hour AS hour,
+            r.model_version AS model_version,
+            r.predicted_label AS predicted_label,
+            count() AS feedback_total,
+            countIf(f.user_rating = 'correct') AS feedback_correct
+        FROM {CH_DB_NAME}.feedback AS f
+        INNER JOIN (
+            SELECT request_id, request_hour, model_version, predicted_label
+            FROM {CH_DB_NAME}.request_versions
+            WHERE request_id IN (SELECT request_id FROM {CH_DB_NAME}.feedback)
+        ) AS r ON f.request_id = r.request_id
+    """
+    bot_client.execute(f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {CH_DB_NAME}.model_stats_hourly_requests_mv
+    TO {CH_DB_NAME}.model_stats_hourly AS
+    {requests_stats_select}
+    GROUP BY hour, model_version, predicted_label
+    """)
+    bot_client.execute(f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {CH_DB_NAME}.request_versions_mv
+    TO {CH_DB_NAME}.request_versions AS
+    {request_versions_select}
+    """)
+    bot_client.execute(f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {CH_DB_NAME}.model_stats_hourly_feedback_mv
+    TO {CH_DB_NAME}.model_stats_hourly AS
+    {feedback_stats_select}
+    GROUP BY hour, model_version, predicted_label
+    """)
+    logging.info("Агрегаты 'model_stats_hourly' и materialized views созданы или уже существуют.")
+
+    if stats_table_exists:
+        return
+    # Первое создание: переносим накопленную историю (без POPULATE, чтобы не потерять параллельные вставки)
+    params = {"backfill_before": backfill_before}
+    bot_client.execute(f"""
+    INSERT INTO {CH_DB_NAME}.request_versions
+    {request_versions_select}
+    WHERE request_timestamp < %(backfill_before)s
+    """, params)
+    bot_client.execute(f"""
+    INSERT INTO {CH_DB_NAME}.model_stats_hourly
+        (hour, model_version, predicted_label, requests, cached_requests, processing_time_quantiles, predict_time_quantiles)
+    {requests_stats_select}
+    WHERE request_timestamp < %(backfill_before)s
+    GROUP BY hour, model_version, predicted_label
+    """, params)
+    bot_client.execute(f"""
+    INSERT INTO {CH_DB_NAME}.model_stats_hourly (hour, model_version, predicted_label, feedback_total, feedback_correct)
+    SELECT r.request_hour, r.model_version, r.predicted_label, count(), countIf(f.user_rating = 'correct')
+    FROM {CH_DB_NAME}.feedback AS f
+    INNER JOIN {CH_DB_NAME}.request_versions AS r ON f.request_id = r.request_id
+    WHERE f.feedback_timestamp < %(backfill_before)s
+    GROUP BY r.request_hour, r.model_version, r.predicted_label
+    """, params)
+    logging.info(f"История requests_log и feedback до {backfill_before} перенесена в 'model_stats_hourly'.")
+
 def create_database_and_tables():
     try:
         admin_client = Client(
@@ -45,19 +215,36 @@ def create_database_and_tables():
         bot_client.execute(f"""
         CREATE TABLE IF NOT EXISTS {CH_DB_NAME}.requests_log (
             request_id UUID DEFAULT generateUUIDv4(),
-            user_id Int64,
-            chat_id Int64,
-            message_id Int64,
-            request_timestamp DateTime DEFAULT now(),
-            news_text String,
-            predicted_label String,
-            prediction_probability Float32,
-            model_version String DEFAULT '1.0',
-            processing_time_ms UInt32
+            user_id Int64 CODEC(T64, ZSTD(1)),
+            chat_id Int64 CODEC(T64, ZSTD(1)),
+            message_id Int64 CODEC(T64, ZSTD(1)),
+            request_timestamp DateTime DEFAULT now() CODEC(Delta, ZSTD(1)),
+            text_hash UInt64, -- ключ текста в news_texts
+            predicted_label LowCardinality(String),
+            prediction_probability Float32 CODEC(ZSTD(1)),
+            model_version LowCardinality(String) DEFAULT '1.0',
+            processing_time_ms UInt32 CODEC(T64, ZSTD(1)),
+            is_cached UInt8 DEFAULT 0 CODEC(ZSTD(1)),
+            queue_wait_ms Float32 DEFAULT 0 CODEC(ZSTD(1)),
+            preprocess_ms Float32 DEFAULT 0 CODEC(ZSTD(1)),
+            vectorize_ms Float32 DEFAULT 0 CODEC(ZSTD(1)),
+            predict_ms Float32 DEFAULT 0 CODEC(ZSTD(1)),
+            telegram_ms Float32 DEFAULT 0 CODEC(ZSTD(1)),
+            request_group_id UUID DEFAULT request_id
         ) ENGINE = MergeTree()
         ORDER BY (request_timestamp, user_id)
         PARTITION BY toYYYYMM(request_timestamp)
         """)
+        # Для таблиц, созданных до появления кэша результатов
+        bot_client.execute(f"ALTER TABLE {CH_DB_NAME}.requests_log ADD COLUMN IF NOT EXISTS is_cached UInt8 DEFAULT 0")
+        # Поэтапные задержки обработки запроса
+        for stage_column in ("queue_wait_ms", "preprocess_ms", "vectorize_ms", "predict_ms", "telegram_ms"):
+            bot_client.execute(f"ALTER TABLE {CH_DB_NAME}.requests_log "
+                               f"ADD COLUMN IF NOT EXISTS {stage_column} Float32 DEFAULT 0")
+        # Строки одного сравнения моделей (по строке на модель и строка общего вердикта)
+        bot_client.execute(f"ALTER TABLE {CH_DB_NAME}.requests_log "
+                           f"ADD COLUMN IF NOT EXISTS request_group_id UUID DEFAULT request_id")
+        migrate_requests_log_storage(bot_client)
         logging.info("Таблица 'requests_log' создана или уже существует.")
 
         bot_client.execute(f"""
@@ -66,14 +253,18 @@ def create_database_and_tables():
             request_id UUID,
             user_id Int64,
             feedback_timestamp DateTime DEFAULT now(),
-            user_rating String, -- 'correct', 'incorrect'
+            user_rating Enum8('correct' = 1, 'incorrect' = 2),
             user_comment String DEFAULT ''
         ) ENGINE = MergeTree()
         ORDER BY (feedback_timestamp, request_id)
         PARTITION BY toYYYYMM(feedback_timestamp)
         """)
+        bot_client.execute(f"ALTER TABLE {CH_DB_NAME}.feedback "
+                           f"MODIFY COLUMN user_rating Enum8('correct' = 1, 'incorrect' = 2)")
         logging.info("Таблица 'feedback' создана или уже существует.")
 
+        create_stats_views(bot_client)
+
         bot_client.disconnect()
         logging.info("Инициализация базы данных завершена успешно.")
 